@@ -1,29 +1,213 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, g, Response, has_request_context
 from flask_cors import CORS
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, insert, select, literal, delete, func
 from sqlalchemy.orm import sessionmaker
-import os, datetime, uuid, traceback, io
-from PIL import Image
-import numpy as np
-import cv2
-from models import Base, User, Attendance, Role, Profile, Announcement, Complaint
+from werkzeug.utils import secure_filename
+import os, datetime, traceback, io, csv, zipfile, time
+from concurrent.futures import ThreadPoolExecutor
+import click
+from models import Base, User, Attendance, Role, Profile, Announcement, Complaint, FaceImage, AttendanceArchive
+import metrics
+import query_stats
+from attendance_cache import VerdictCache, MarkedToday, frame_hash
+import attendance_session
+import attendance_archive
+import face_store
+import image_variants
+from response_cache import ResponseCache
+# NumPy, PIL and lbph are imported inside the recognition/training paths so that
+# importing this module (worker boot, CLI, tests) stays cheap
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-ANNOUNCEMENT_IMAGE_FOLDER = os.path.join(BASE_DIR, 'announcement_images')
-os.makedirs(ANNOUNCEMENT_IMAGE_FOLDER, exist_ok=True)
+ANNOUNCEMENT_IMAGE_FOLDER = os.environ.get('ANNOUNCEMENT_IMAGE_FOLDER', os.path.join(BASE_DIR, 'announcement_images'))
 
 
 app = Flask(__name__)
 CORS(app)
+# Opt-in X-DB-Query-Count / X-DB-Time-Ms response headers
+app.config['SQL_STATS_HEADERS'] = os.environ.get('SQL_STATS_HEADERS') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+
+# Metrics (exposed at /metrics in Prometheus text format)
+HTTP_REQUESTS = metrics.Counter('http_requests_total', 'HTTP requests by route and status', ('method', 'route', 'status'))
+HTTP_LATENCY = metrics.Histogram('http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route'))
+HTTP_IN_FLIGHT = metrics.Gauge('http_requests_in_flight', 'HTTP requests currently being served', ('method', 'route'))
+RECOGNITION_STAGE = metrics.Histogram('recognition_stage_duration_seconds', 'Time spent in each /attendance/mark stage', ('stage',),
+                                      buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+RECOGNITION_CONFIDENCE = metrics.Histogram('recognition_confidence', 'LBPH distance of the best match (lower is more confident)',
+                                           buckets=(10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 125, 150, 200))
+TRAINING_DURATION = metrics.Histogram('training_duration_seconds', 'Duration of train_model runs',
+                                      buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+TRAINING_IMAGES = metrics.Counter('training_images_processed_total', 'Face images read by train_model')
+TRAINING_RUNS = metrics.Counter('training_runs_total', 'train_model runs by result', ('result',))
+DB_QUERIES = metrics.Histogram('db_queries_per_request', 'SQL statements executed per request', ('method', 'route'),
+                               buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500))
+DB_TIME = metrics.Histogram('db_time_per_request_seconds', 'Time spent in SQL statements per request', ('method', 'route'))
+DB_SLOW_QUERIES = metrics.Counter('db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS', ('route',))
+SESSION_FRAMES = metrics.Counter('attendance_session_frames_total', 'Frames received by attendance sessions', ('result',))
+SESSION_OUTCOMES = metrics.Counter('attendance_sessions_total', 'Finished attendance sessions by outcome', ('outcome',))
+MARK_SHORTCIRCUIT = metrics.Counter('attendance_mark_shortcircuit_total', '/attendance/mark requests answered without recognition', ('reason',))
+RESPONSE_CACHE = metrics.Counter('response_cache_requests_total', 'Cached read endpoints by result (hit, miss, not_modified)', ('tag', 'result'))
+
+def _route_label():
+    # Use the URL rule, not the path, so per-username URLs don't explode label cardinality
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def _start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    g.metrics_route = _route_label()
+    HTTP_IN_FLIGHT.inc(method=request.method, route=g.metrics_route)
+
+@app.after_request
+def _record_response_status(response):
+    g.metrics_status = response.status_code
+    if app.config['SQL_STATS_HEADERS']:
+        response.headers['X-DB-Query-Count'] = str(g.get('sql_query_count', 0))
+        response.headers['X-DB-Time-Ms'] = f"{g.get('sql_query_seconds', 0.0) * 1e3:.2f}"
+    return response
+
+@app.teardown_request
+def _finish_request_metrics(exc):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    route = g.pop('metrics_route')
+    status = g.pop('metrics_status', 500)
+    HTTP_IN_FLIGHT.dec(method=request.method, route=route)
+    HTTP_LATENCY.observe(time.perf_counter() - start, method=request.method, route=route)
+    HTTP_REQUESTS.inc(method=request.method, route=route, status=status)
+    DB_QUERIES.observe(g.pop('sql_query_count', 0), method=request.method, route=route)
+    DB_TIME.observe(g.pop('sql_query_seconds', 0.0), method=request.method, route=route)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
 
 # DB setup
-DB_PATH = os.path.join(BASE_DIR, 'database.db')
+DB_PATH = os.environ.get('DB_PATH', os.path.join(BASE_DIR, 'database.db'))
 engine = create_engine(f"sqlite:///{DB_PATH}", echo=False)
 
 SessionLocal = sessionmaker(bind=engine)
 
+def _log_slow_query(statement, elapsed):
+    route = _route_label() if has_request_context() else 'cli'
+    DB_SLOW_QUERIES.inc(route=route)
+    app.logger.warning('Slow query (%.1f ms) on %s: %s', elapsed * 1e3, route, ' '.join(statement.split()))
+
+query_stats.instrument(engine, SLOW_QUERY_MS / 1000.0, _log_slow_query)
+
+def _usernames_marked_on(date):
+    db = SessionLocal()
+    try:
+        return [u for (u,) in db.query(User.username)
+                .join(Profile, Profile.user_id == User.user_id)
+                .join(Attendance, Attendance.student_id == Profile.profile_id)
+                .filter(Attendance.attendance_date == date)]
+    finally:
+        db.close()
+
+# Retry-storm short-circuits for /attendance/mark
+verdict_cache = VerdictCache(int(os.environ.get('FRAME_CACHE_SIZE', '2048')))
+marked_today = MarkedToday(_usernames_marked_on, float(os.environ.get('MARKED_TODAY_REFRESH_SECONDS', '60')))
 
-Base.metadata.create_all(engine)
+# Dashboard list endpoints; tags are 'announcements', 'students' and 'teachers'
+response_cache = ResponseCache(float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '30')))
+
+def cached_json_response(tag, role, build):
+    # build() -> (payload, status); only 200 payloads are cached. Clients revalidate every time
+    # (no-cache) and get a 304 when their ETag / Last-Modified is still current
+    entry = response_cache.get((tag, role))
+    result = 'hit'
+    if entry is None:
+        generation = response_cache.generation(tag)
+        payload, status = build()
+        if status != 200:
+            return jsonify(payload), status
+        entry = response_cache.put((tag, role), jsonify(payload).get_data(), generation)
+        result = 'miss'
+    response = app.response_class(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    response.last_modified = entry.last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response = response.make_conditional(request)
+    RESPONSE_CACHE.inc(tag=tag, result='not_modified' if response.status_code == 304 else result)
+    return response
+
+# Closed academic years are moved out of the attendance table by `flask archive-attendance`
+ACADEMIC_YEAR_START_MONTH = int(os.environ.get('ACADEMIC_YEAR_START_MONTH', '6'))
+
+def current_academic_year_start():
+    year = attendance_archive.academic_year_of(datetime.date.today(), ACADEMIC_YEAR_START_MONTH)
+    return attendance_archive.academic_year_bounds(year, ACADEMIC_YEAR_START_MONTH)[0]
+
+def archived_attendance(db, student_id, start_dt, end_dt):
+    # [(date, status, remarks)] from attendance_archive; only closed years are archived, so
+    # ranges inside the current academic year skip the query
+    if start_dt >= current_academic_year_start():
+        return []
+    rows = db.query(AttendanceArchive).filter(
+        AttendanceArchive.student_id == student_id,
+        AttendanceArchive.start_date <= end_dt,
+        AttendanceArchive.end_date >= start_dt
+    ).order_by(AttendanceArchive.start_date.asc()).all()
+    return [rec for row in rows for rec in attendance_archive.decode(row, start_dt, end_dt)]
+
+def delete_archived_attendance(db, student_id, start_dt, end_dt):
+    # Clears archived days in the range; returns how many were removed. The caller commits.
+    if start_dt >= current_academic_year_start():
+        return 0
+    count = 0
+    rows = db.query(AttendanceArchive).filter(
+        AttendanceArchive.student_id == student_id,
+        AttendanceArchive.start_date <= end_dt,
+        AttendanceArchive.end_date >= start_dt
+    ).all()
+    for row in rows:
+        kept = [rec for rec in attendance_archive.decode(row) if not start_dt <= rec[0] <= end_dt]
+        count += row.day_count - len(kept)
+        if not kept:
+            db.delete(row)
+            continue
+        for column, value in attendance_archive.encode(row.start_date, row.end_date, kept).items():
+            setattr(row, column, value)
+    return count
+
+def archive_attendance_year(db, year):
+    # Moves every attendance row of one academic year into attendance_archive, merging with
+    # rows archived earlier (hot rows win for the same day). One transaction per year; only the
+    # rows read here are deleted, so a row written for that year meanwhile stays in the hot
+    # table for the next run. Returns (students, rows moved).
+    start, end = attendance_archive.academic_year_bounds(year, ACADEMIC_YEAR_START_MONTH)
+    in_year = (Attendance.attendance_date >= start, Attendance.attendance_date <= end)
+    hot = {}
+    attendance_ids = []
+    rows = db.execute(select(Attendance.attendance_id, Attendance.student_id, Attendance.attendance_date,
+                             Attendance.status, Attendance.remarks)
+                      .where(*in_year).order_by(Attendance.student_id, Attendance.attendance_id))
+    for attendance_id, student_id, date, status, remarks in rows:
+        hot.setdefault(student_id, []).append((date, status, remarks))
+        attendance_ids.append(attendance_id)
+    if not hot:
+        return 0, 0
+    existing = {a.student_id: a for a in db.query(AttendanceArchive).filter(
+        AttendanceArchive.academic_year == year, AttendanceArchive.student_id.in_(list(hot))).all()}
+    new_rows = []
+    for student_id, records in hot.items():
+        archived = existing.get(student_id)
+        if archived is not None:
+            values = attendance_archive.encode(start, end, attendance_archive.decode(archived) + records)
+            for column, value in values.items():
+                setattr(archived, column, value)
+        else:
+            new_rows.append(dict(attendance_archive.encode(start, end, records), student_id=student_id, academic_year=year))
+    for batch in _batches(new_rows):
+        db.execute(insert(AttendanceArchive), batch)
+    for batch in _batches(attendance_ids):
+        db.execute(delete(Attendance).where(Attendance.attendance_id.in_(batch)))
+    db.commit()
+    return len(hot), len(attendance_ids)
 
 # Seed users
 def seed():
@@ -64,7 +248,13 @@ def seed():
         print('Seed error:', e)
     finally:
         db.close()
-seed()
+
+def init_db():
+    # Storage folders, schema and seed data; run once per deployment via `flask init-db`
+    os.makedirs(ANNOUNCEMENT_IMAGE_FOLDER, exist_ok=True)
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    Base.metadata.create_all(engine)
+    seed()
 
 # API to change password for a user
 @app.route('/auth/change-password', methods=['POST'])
@@ -136,7 +326,10 @@ def delete_attendance_records():
         for r in records:
             db.delete(r)
             count += 1
+        count += delete_archived_attendance(db, profile.profile_id, start_dt, end_dt)
         db.commit()
+        if start_dt <= datetime.date.today() <= end_dt:
+            marked_today.discard(username)
         return jsonify({'ok': True, 'msg': f'Deleted {count} attendance records for {username} between {start_date} and {end_date}.'})
     except Exception as e:
         db.rollback()
@@ -176,11 +369,15 @@ def delete_student(username):
         attendance_records = db.query(Attendance).filter_by(student_id=profile.profile_id).all()
         for record in attendance_records:
             db.delete(record)
+        db.query(AttendanceArchive).filter_by(student_id=profile.profile_id).delete()
+        db.query(FaceImage).filter_by(student_id=profile.profile_id).delete()
         db.flush()
         # Then delete profile and user
         db.delete(profile)
         db.delete(user)
         db.commit()
+        marked_today.discard(username)
+        verdict_cache.clear()
         # Optionally, delete FaceID directory
         user_dir = os.path.join(UPLOAD_FOLDER, username)
         if os.path.isdir(user_dir):
@@ -189,6 +386,7 @@ def delete_student(username):
                 shutil.rmtree(user_dir)
             except Exception as e:
                 print(f"Error deleting FaceID directory {user_dir}: {e}")
+        response_cache.invalidate('students')
         return jsonify({'ok': True, 'msg': f'Student {username} deleted successfully'})
     except Exception as e:
         db.rollback()
@@ -351,6 +549,7 @@ def add_teacher():
         )
         db.add(profile)
         db.commit()
+        response_cache.invalidate('teachers')
         return jsonify({'ok': True, 'msg': 'Teacher added successfully', 'username': username, 'password': password})
     except Exception as e:
         db.rollback()
@@ -390,6 +589,7 @@ def delete_teacher(username):
         db.delete(profile)
         db.delete(user)
         db.commit()
+        response_cache.invalidate('teachers')
         return jsonify({'ok': True, 'msg': f'Teacher {username} deleted successfully'})
     except Exception as e:
         db.rollback()
@@ -439,7 +639,7 @@ def mark_attendance_manual():
             already_marked = db.query(Attendance).filter(
                 Attendance.student_id == profile.profile_id,
                 Attendance.attendance_date == mark_date
-            ).first()
+            ).first() or archived_attendance(db, profile.profile_id, mark_date, mark_date)
             if already_marked:
                 results.append({'username': username, 'msg': 'Already marked present for this date'})
             else:
@@ -451,6 +651,9 @@ def mark_attendance_manual():
                 db.add(att)
                 results.append({'username': username, 'msg': 'Marked present'})
         db.commit()
+        for r in results:
+            if r['msg'] == 'Marked present':
+                marked_today.add(r['username'], mark_date)
         return jsonify({'ok': True, 'results': results})
     except Exception as e:
         db.rollback()
@@ -476,31 +679,56 @@ def get_username_by_email(email):
     finally:
         db.close()
 
+# Content-addressed files (announcement images and variants, enrollment images) never change
+# under the same name, so clients and proxies may keep them for a year without revalidating
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def send_stored_file(folder, filename):
+    content_hash = image_variants.content_hash(filename)
+    if content_hash is None:
+        return send_from_directory(folder, filename)
+    etag = os.path.splitext(os.path.basename(filename))[0]
+    response = send_from_directory(folder, filename, etag=etag, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+def announcement_image_urls(fname):
+    # URLs of an announcement image and its variants; images stored before variants existed
+    # use the original for every size
+    only_fname = os.path.basename(fname.lstrip('/\\'))
+    original = f"/announcement_images/{only_fname}"
+    urls = {'original': original}
+    for variant in image_variants.VARIANTS:
+        if image_variants.content_hash(only_fname):
+            urls[variant] = f"/announcement_images/{image_variants.variant_name(only_fname, variant)}"
+        else:
+            urls[variant] = original
+    return urls
+
 # Serve announcement images
 @app.route('/announcement_images/<filename>')
 def serve_announcement_image(filename):
-    return send_from_directory(ANNOUNCEMENT_IMAGE_FOLDER, filename)
+    return send_stored_file(ANNOUNCEMENT_IMAGE_FOLDER, filename)
 
 # API to get all announcements
 @app.route('/admin/get-announcements', methods=['GET'])
 def get_announcements():
     db = SessionLocal()
     try:
-        announcements = db.query(Announcement).order_by(Announcement.id.desc()).all()
-        result = []
-        for ann in announcements:
-            images = []
-            if ann.images:
-                for fname in ann.images.split(','):
-                    only_fname = os.path.basename(fname.lstrip('/\\'))
-                    images.append(f"/announcement_images/{only_fname}")
-            result.append({
-                'id': ann.id,
-                'title': ann.title,
-                'description': ann.description,
-                'images': images
-            })
-        return jsonify({'ok': True, 'announcements': result})
+        def build():
+            announcements = db.query(Announcement).order_by(Announcement.id.desc()).all()
+            result = []
+            for ann in announcements:
+                variants = [announcement_image_urls(fname) for fname in ann.images.split(',')] if ann.images else []
+                result.append({
+                    'id': ann.id,
+                    'title': ann.title,
+                    'description': ann.description,
+                    'images': [v['original'] for v in variants],
+                    'image_variants': variants
+                })
+            return {'ok': True, 'announcements': result}, 200
+        return cached_json_response('announcements', 'public', build)
     except Exception as e:
         return jsonify({'ok': False, 'msg': str(e)}), 500
     finally:
@@ -524,34 +752,36 @@ def get_student_list():
         acting_role = db.query(Role).filter_by(role_id=acting_profile.role_id).first() if acting_profile else None
         if not acting_role or acting_role.role_name not in ('Teacher', 'Admin'):
             return jsonify({'ok': False, 'msg': 'Only Teacher or Admin can access student list'}), 403
-        # Get Student role
-        student_role = db.query(Role).filter_by(role_name='Student').first()
-        if not student_role:
-            return jsonify({'ok': False, 'msg': 'Student role not found'}), 500
-        # Get all students
-        students = db.query(Profile).filter_by(role_id=student_role.role_id).all()
-        result = []
-        for student in students:
-            user = db.query(User).filter_by(user_id=student.user_id).first()
-            username = user.username if user else None
-            # Check if face ID (directory) exists
-            has_face_id = False
-            face_msg = 'Face ID not added'
-            if username:
-                user_dir = os.path.join(UPLOAD_FOLDER, username)
-                if os.path.isdir(user_dir) and len(os.listdir(user_dir)) > 0:
-                    has_face_id = True
-                    face_msg = 'Face ID added'
-            result.append({
-                'profile_id': student.profile_id,
-                'username': username,
-                'first_name': student.first_name,
-                'last_name': student.last_name,
-                'email_id': student.email_id,
-                'has_face_id': has_face_id,
-                'face_msg': face_msg
-            })
-        return jsonify({'ok': True, 'students': result})
+        def build():
+            # Get Student role
+            student_role = db.query(Role).filter_by(role_name='Student').first()
+            if not student_role:
+                return {'ok': False, 'msg': 'Student role not found'}, 500
+            # Get all students
+            students = db.query(Profile).filter_by(role_id=student_role.role_id).all()
+            result = []
+            for student in students:
+                user = db.query(User).filter_by(user_id=student.user_id).first()
+                username = user.username if user else None
+                # Check if face ID (directory) exists
+                has_face_id = False
+                face_msg = 'Face ID not added'
+                if username:
+                    user_dir = os.path.join(UPLOAD_FOLDER, username)
+                    if os.path.isdir(user_dir) and len(os.listdir(user_dir)) > 0:
+                        has_face_id = True
+                        face_msg = 'Face ID added'
+                result.append({
+                    'profile_id': student.profile_id,
+                    'username': username,
+                    'first_name': student.first_name,
+                    'last_name': student.last_name,
+                    'email_id': student.email_id,
+                    'has_face_id': has_face_id,
+                    'face_msg': face_msg
+                })
+            return {'ok': True, 'students': result}, 200
+        return cached_json_response('students', acting_role.role_name, build)
     except Exception as e:
         return jsonify({'ok': False, 'msg': str(e)}), 500
     finally:
@@ -574,24 +804,26 @@ def get_teacher_list():
         acting_role = db.query(Role).filter_by(role_id=acting_profile.role_id).first() if acting_profile else None
         if not acting_role or acting_role.role_name != 'Admin':
             return jsonify({'ok': False, 'msg': 'Only Admin can access teacher list'}), 403
-        # Get Teacher role
-        teacher_role = db.query(Role).filter_by(role_name='Teacher').first()
-        if not teacher_role:
-            return jsonify({'ok': False, 'msg': 'Teacher role not found'}), 500
-        # Get all teachers
-        teachers = db.query(Profile).filter_by(role_id=teacher_role.role_id).all()
-        result = []
-        for teacher in teachers:
-            user = db.query(User).filter_by(user_id=teacher.user_id).first()
-            username = user.username if user else None
-            result.append({
-                'profile_id': teacher.profile_id,
-                'username': username,
-                'first_name': teacher.first_name,
-                'last_name': teacher.last_name,
-                'email_id': teacher.email_id
-            })
-        return jsonify({'ok': True, 'teachers': result})
+        def build():
+            # Get Teacher role
+            teacher_role = db.query(Role).filter_by(role_name='Teacher').first()
+            if not teacher_role:
+                return {'ok': False, 'msg': 'Teacher role not found'}, 500
+            # Get all teachers
+            teachers = db.query(Profile).filter_by(role_id=teacher_role.role_id).all()
+            result = []
+            for teacher in teachers:
+                user = db.query(User).filter_by(user_id=teacher.user_id).first()
+                username = user.username if user else None
+                result.append({
+                    'profile_id': teacher.profile_id,
+                    'username': username,
+                    'first_name': teacher.first_name,
+                    'last_name': teacher.last_name,
+                    'email_id': teacher.email_id
+                })
+            return {'ok': True, 'teachers': result}, 200
+        return cached_json_response('teachers', acting_role.role_name, build)
     except Exception as e:
         return jsonify({'ok': False, 'msg': str(e)}), 500
     finally:
@@ -607,19 +839,22 @@ def add_announcement():
     if not title or not description:
         return jsonify({'ok': False, 'msg': 'Title and description are required'}), 400
     image_filenames = []
-    # Create directory if not exists (already ensured above)
+    # Stored by content hash with thumb/medium variants rendered now, not on every view
     for file in files:
         if file and file.filename:
-            fname = f"{uuid.uuid4().hex}_{file.filename}"
-            path = os.path.join(ANNOUNCEMENT_IMAGE_FOLDER, fname)
-            file.save(path)
-            image_filenames.append(fname)
+            try:
+                fname = image_variants.store_image(ANNOUNCEMENT_IMAGE_FOLDER, file.read())
+            except (OSError, ValueError):
+                return jsonify({'ok': False, 'msg': f'{file.filename} is not a supported image'}), 400
+            if fname not in image_filenames:
+                image_filenames.append(fname)
     images_str = ','.join(image_filenames) if image_filenames else None
     db = SessionLocal()
     try:
         announcement = Announcement(title=title, description=description, images=images_str)
         db.add(announcement)
         db.commit()
+        response_cache.invalidate('announcements')
         return jsonify({'ok': True, 'msg': 'Announcement added successfully', 'id': announcement.id})
     except Exception as e:
         db.rollback()
@@ -636,18 +871,31 @@ def delete_announcement(announcement_id):
         announcement = db.query(Announcement).filter_by(id=announcement_id).first()
         if not announcement:
             return jsonify({'ok': False, 'msg': 'Announcement not found'}), 404
-        # Delete associated images from filesystem
+        # Delete associated images from filesystem; a content-addressed image is kept while
+        # another announcement still uses it
         if announcement.images:
             for fname in announcement.images.split(','):
                 only_fname = os.path.basename(fname.lstrip('/\\'))
-                img_path = os.path.join(ANNOUNCEMENT_IMAGE_FOLDER, only_fname)
-                if os.path.isfile(img_path):
-                    try:
-                        os.remove(img_path)
-                    except Exception as e:
-                        print(f"Error deleting image {img_path}: {e}")
+                if image_variants.content_hash(only_fname):
+                    shared = db.query(Announcement.id).filter(
+                        Announcement.id != announcement.id,
+                        Announcement.images.like(f'%{only_fname}%')
+                    ).first()
+                    if shared:
+                        continue
+                    names = image_variants.file_names(only_fname)
+                else:
+                    names = [only_fname]
+                for name in names:
+                    img_path = os.path.join(ANNOUNCEMENT_IMAGE_FOLDER, name)
+                    if os.path.isfile(img_path):
+                        try:
+                            os.remove(img_path)
+                        except Exception as e:
+                            print(f"Error deleting image {img_path}: {e}")
         db.delete(announcement)
         db.commit()
+        response_cache.invalidate('announcements')
         return jsonify({'ok': True, 'msg': 'Announcement and images deleted'})
     except Exception as e:
         db.rollback()
@@ -722,6 +970,7 @@ def add_student():
         )
         db.add(profile)
         db.commit()
+        response_cache.invalidate('students')
         return jsonify({'ok': True, 'msg': 'Student added successfully', 'username': username, 'password': password})
     except Exception as e:
         db.rollback()
@@ -729,9 +978,151 @@ def add_student():
     finally:
         db.close()
 
-UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-MODEL_PATH = os.path.join(BASE_DIR, 'lbph_model.yml')
+# Bulk student import
+ROSTER_FIELDS = ('username', 'password', 'first_name', 'last_name', 'email_id')
+IMPORT_BATCH_SIZE = 500
+
+def _batches(items, size=IMPORT_BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+def import_student_roster(db, rows):
+    # rows: iterable of dicts with ROSTER_FIELDS; returns (created usernames, skipped rows)
+    # Users and profiles are inserted in batched statements; duplicates are found with one query
+    candidates = []
+    skipped = []
+    seen_usernames, seen_emails = set(), set()
+    # Numbered like the CSV file: line 1 is the header
+    for line_no, row in enumerate(rows, start=2):
+        row = {k: (row.get(k) or '').strip() for k in ROSTER_FIELDS}
+        if not all(row.values()):
+            skipped.append({'row': line_no, 'username': row['username'] or None, 'msg': 'All fields are required'})
+        elif row['username'] in seen_usernames:
+            skipped.append({'row': line_no, 'username': row['username'], 'msg': 'Duplicate username in roster'})
+        elif row['email_id'] in seen_emails:
+            skipped.append({'row': line_no, 'username': row['username'], 'msg': 'Duplicate email in roster'})
+        else:
+            seen_usernames.add(row['username'])
+            seen_emails.add(row['email_id'])
+            candidates.append((line_no, row))
+    if not candidates:
+        return [], skipped
+    # Single duplicate check against existing users and profiles
+    existing = db.execute(
+        select(literal('username'), User.username).where(User.username.in_(seen_usernames))
+        .union_all(select(literal('email'), Profile.email_id).where(Profile.email_id.in_(seen_emails)))
+    ).all()
+    taken_usernames = {value for kind, value in existing if kind == 'username'}
+    taken_emails = {value for kind, value in existing if kind == 'email'}
+    new_rows = []
+    for line_no, row in candidates:
+        if row['username'] in taken_usernames:
+            skipped.append({'row': line_no, 'username': row['username'], 'msg': 'Username already exists'})
+        elif row['email_id'] in taken_emails:
+            skipped.append({'row': line_no, 'username': row['username'], 'msg': 'Email already exists'})
+        else:
+            new_rows.append(row)
+    if not new_rows:
+        return [], skipped
+    student_role = db.query(Role).filter_by(role_name='Student').first()
+    if not student_role:
+        raise RuntimeError('Student role not found')
+    for batch in _batches(new_rows):
+        db.execute(insert(User), [{'username': r['username'], 'password': r['password']} for r in batch])
+        user_ids = dict(db.execute(
+            select(User.username, User.user_id).where(User.username.in_([r['username'] for r in batch]))
+        ).all())
+        db.execute(insert(Profile), [{
+            'user_id': user_ids[r['username']],
+            'role_id': student_role.role_id,
+            'first_name': r['first_name'],
+            'last_name': r['last_name'],
+            'email_id': r['email_id']
+        } for r in batch])
+    db.commit()
+    response_cache.invalidate('students')
+    return [r['username'] for r in new_rows], skipped
+
+def read_roster_csv(stream):
+    # Accepts a binary stream; tolerates a UTF-8 BOM from spreadsheet exports
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    missing = [f for f in ROSTER_FIELDS if f not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Roster is missing columns: {', '.join(missing)}")
+    return list(reader)
+
+# API to import students from a CSV roster (Admin/Teacher only)
+@app.route('/admin/import-students', methods=['POST'])
+def import_students():
+    # expects form-data: roster (CSV file with username,password,first_name,last_name,email_id)
+    token = request.headers.get('Authorization') or request.form.get('token')
+    if not token or not token.startswith('demo-'):
+        return jsonify({'ok': False, 'msg': 'Missing or invalid token'}), 401
+    roster = request.files.get('roster')
+    if not roster:
+        return jsonify({'ok': False, 'msg': 'roster file is required'}), 400
+    acting_username = token.replace('demo-', '', 1)
+    db = SessionLocal()
+    try:
+        acting_user = db.query(User).filter_by(username=acting_username).first()
+        if not acting_user:
+            return jsonify({'ok': False, 'msg': 'Invalid user for token'}), 401
+        acting_profile = db.query(Profile).filter_by(user_id=acting_user.user_id).first()
+        acting_role = db.query(Role).filter_by(role_id=acting_profile.role_id).first() if acting_profile else None
+        if not acting_role or acting_role.role_name not in ('Teacher', 'Admin'):
+            return jsonify({'ok': False, 'msg': 'Only Teacher or Admin can import students'}), 403
+        try:
+            rows = read_roster_csv(roster.stream)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            return jsonify({'ok': False, 'msg': f'Invalid roster: {e}'}), 400
+        created, skipped = import_student_roster(db, rows)
+        return jsonify({'ok': True, 'msg': f'Imported {len(created)} students', 'created': created, 'skipped': skipped})
+    except Exception as e:
+        db.rollback()
+        return jsonify({'ok': False, 'msg': str(e)}), 500
+    finally:
+        db.close()
+
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'uploads'))
+# Enrollment images are downscaled to this longest side and re-encoded at this JPEG quality
+ENROLL_MAX_SIDE = int(os.environ.get('ENROLL_MAX_SIDE', str(face_store.MAX_SIDE)))
+ENROLL_JPEG_QUALITY = int(os.environ.get('ENROLL_JPEG_QUALITY', str(face_store.JPEG_QUALITY)))
+# Model store; point MODEL_STORE_DIR at a shared directory when running several app servers
+MODEL_DIR = os.environ.get('MODEL_STORE_DIR', os.path.join(BASE_DIR, 'lbph_model'))
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', '2'))
+LEGACY_MODEL_PATH = os.path.join(BASE_DIR, 'lbph_model.yml')
+_model_registry = None
+
+def get_model_registry():
+    # Created on the first recognition/training call
+    global _model_registry
+    if _model_registry is None:
+        import lbph
+        _model_registry = lbph.ModelRegistry(MODEL_DIR, MODEL_RELOAD_INTERVAL)
+    return _model_registry
+
+def load_recognizer():
+    # Returns the currently published model, migrating a legacy YAML model on first use
+    import lbph
+    registry = get_model_registry()
+    recognizer = registry.get()
+    if recognizer is None and os.path.exists(LEGACY_MODEL_PATH):
+        try:
+            lbph.convert_yaml_model(LEGACY_MODEL_PATH, MODEL_DIR, get_label_mapping())
+        except RuntimeError as e:
+            app.logger.warning('Legacy model not migrated: %s', e)
+            return None
+        recognizer = registry.reload()
+    return recognizer
+
+def face_array(fp):
+    # 200x200 grayscale uint8 array, the input size the recognizer is trained on. EXIF
+    # orientation is applied as in face_store.normalize_image, so probes match enrollment
+    from PIL import Image, ImageOps
+    import numpy as np
+    with Image.open(fp) as img:
+        return np.array(ImageOps.exif_transpose(img).convert('L').resize((200,200)), dtype=np.uint8)
 
 def get_label_mapping():
     # labels: username -> integer id
@@ -742,26 +1133,32 @@ def get_label_mapping():
 
 def train_model():
     # Train LBPH from images in uploads/
+    import lbph
+    start = time.perf_counter()
     mapping = get_label_mapping()
     faces = []
     labels = []
     for user, label in mapping.items():
         user_dir = os.path.join(UPLOAD_FOLDER, user)
         for fname in os.listdir(user_dir):
+            if fname.startswith('.'):
+                continue
             path = os.path.join(user_dir, fname)
             try:
-                img = Image.open(path).convert('L').resize((200,200))
-                arr = np.array(img, dtype=np.uint8)
-                faces.append(arr)
+                faces.append(face_array(path))
                 labels.append(label)
             except Exception as e:
                 print('skip', path, e)
+    TRAINING_IMAGES.inc(len(faces))
     if not faces:
+        TRAINING_RUNS.inc(result='empty')
         return False, 'no faces to train'
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.train(faces, np.array(labels))
-    recognizer.write(MODEL_PATH)
-    return True, f'trained {len(faces)} faces for {len(mapping)} students'
+    histograms = lbph.compute_histograms(faces, lbph.DEFAULT_PARAMS)
+    manifest = lbph.publish_model(MODEL_DIR, histograms, labels, lbph.DEFAULT_PARAMS, mapping)
+    get_model_registry().reload()
+    TRAINING_DURATION.observe(time.perf_counter() - start)
+    TRAINING_RUNS.inc(result='ok')
+    return True, f"trained {len(faces)} faces for {len(mapping)} students (model {manifest['version']})"
 
 @app.route('/auth/login', methods=['POST'])
 def login():
@@ -784,25 +1181,164 @@ def add_student_webcam():
     file = request.files.get('image')
     if not username or not file:
         return jsonify({'ok':False,'msg':'username and image required'}),400
-    user_dir = os.path.join(UPLOAD_FOLDER, username)
-    os.makedirs(user_dir, exist_ok=True)
-    fname = f"{label}_{uuid.uuid4().hex[:8]}.jpg"
-    path = os.path.join(user_dir, fname)
-    file.save(path)
+    data = file.read(MAX_FACE_IMAGE_BYTES + 1)
+    if len(data) > MAX_FACE_IMAGE_BYTES:
+        return jsonify({'ok':False,'msg':'Image too large'}),400
+    db = SessionLocal()
+    try:
+        profile = db.query(Profile).join(User, User.user_id == Profile.user_id).filter(User.username == username).first()
+        if not profile:
+            return jsonify({'ok':False,'msg':'User not found'}),404
+        try:
+            image, created = enroll_face_image(db, username, profile.profile_id, data, label)
+        except (OSError, ValueError):
+            return jsonify({'ok':False,'msg':'image could not be decoded'}),400
+        db.commit()
+        fname = image.file_name
+        if created:
+            response_cache.invalidate('students')
+    except Exception as e:
+        db.rollback()
+        return jsonify({'ok':False,'msg':str(e)}),500
+    finally:
+        db.close()
+    if not created:
+        return jsonify({'ok':True,'msg':f'{fname} already enrolled; not retrained','duplicate':True})
     # after saving, retrain model
     trained, msg = train_model()
     return jsonify({'ok':True,'msg':f'saved {fname}; retrain: {trained} - {msg}'})
 
+FACE_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+MAX_FACE_IMAGE_BYTES = 10 * 1024 * 1024
+
+def enroll_face_image(db, username, student_id, data, pose_label='capture'):
+    # Normalize and store one enrollment image under uploads/<username>/ and record it;
+    # returns (FaceImage, created). Resubmitting identical content returns the existing row.
+    # The caller commits.
+    stored = face_store.store_image(os.path.join(UPLOAD_FOLDER, username), data, ENROLL_MAX_SIDE, ENROLL_JPEG_QUALITY)
+    existing = db.query(FaceImage).filter_by(student_id=student_id, content_hash=stored['content_hash']).first()
+    if existing:
+        return existing, False
+    image = FaceImage(
+        student_id=student_id,
+        pose_label=(secure_filename(pose_label or '') or 'capture')[:50],
+        content_hash=stored['content_hash'],
+        file_name=stored['file_name'],
+        width=stored['width'],
+        height=stored['height'],
+        byte_size=stored['byte_size'],
+        created_at=datetime.datetime.now(datetime.timezone.utc)
+    )
+    db.add(image)
+    return image, True
+
+def _profile_ids_by_username(db):
+    return dict(db.query(User.username, Profile.profile_id).join(Profile, Profile.user_id == User.user_id).all())
+
+def import_face_archive(db, fileobj, profile_ids):
+    # Enroll <username>/<label>.jpg members one at a time; profile_ids maps username -> profile_id.
+    # Returns (saved count, skipped members); training is left to the caller
+    saved = 0
+    skipped = []
+    with zipfile.ZipFile(fileobj) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            parts = [p for p in info.filename.replace('\\', '/').split('/') if p]
+            if len(parts) < 2 or parts[0] == '__MACOSX' or parts[-1].startswith('.'):
+                continue
+            username, member_name = parts[-2], parts[-1]
+            stem, ext = os.path.splitext(member_name)
+            if ext.lower() not in FACE_IMAGE_EXTENSIONS:
+                skipped.append({'file': info.filename, 'msg': 'Not an image'})
+                continue
+            if username not in profile_ids:
+                skipped.append({'file': info.filename, 'msg': 'Unknown username'})
+                continue
+            if info.file_size > MAX_FACE_IMAGE_BYTES:
+                skipped.append({'file': info.filename, 'msg': 'Image too large'})
+                continue
+            try:
+                _, created = enroll_face_image(db, username, profile_ids[username], zf.read(info), stem.split('_')[0])
+            except (OSError, ValueError):
+                skipped.append({'file': info.filename, 'msg': 'Image could not be decoded'})
+                continue
+            if not created:
+                skipped.append({'file': info.filename, 'msg': 'Duplicate image'})
+                continue
+            saved += 1
+    db.commit()
+    if saved:
+        response_cache.invalidate('students')
+    return saved, skipped
+
+# API to enroll face images for many students from one zip (Admin/Teacher only)
+@app.route('/admin/import-face-images', methods=['POST'])
+def import_face_images():
+    # expects form-data: archive (zip of <username>/<label>.jpg); retrains once at the end
+    token = request.headers.get('Authorization') or request.form.get('token')
+    if not token or not token.startswith('demo-'):
+        return jsonify({'ok': False, 'msg': 'Missing or invalid token'}), 401
+    archive = request.files.get('archive')
+    if not archive:
+        return jsonify({'ok': False, 'msg': 'archive file is required'}), 400
+    acting_username = token.replace('demo-', '', 1)
+    db = SessionLocal()
+    try:
+        acting_user = db.query(User).filter_by(username=acting_username).first()
+        if not acting_user:
+            return jsonify({'ok': False, 'msg': 'Invalid user for token'}), 401
+        acting_profile = db.query(Profile).filter_by(user_id=acting_user.user_id).first()
+        acting_role = db.query(Role).filter_by(role_id=acting_profile.role_id).first() if acting_profile else None
+        if not acting_role or acting_role.role_name not in ('Teacher', 'Admin'):
+            return jsonify({'ok': False, 'msg': 'Only Teacher or Admin can import face images'}), 403
+        profile_ids = _profile_ids_by_username(db)
+        try:
+            saved, skipped = import_face_archive(db, archive.stream, profile_ids)
+        except zipfile.BadZipFile:
+            return jsonify({'ok': False, 'msg': 'archive is not a valid zip file'}), 400
+    except Exception as e:
+        db.rollback()
+        return jsonify({'ok': False, 'msg': str(e)}), 500
+    finally:
+        db.close()
+    trained, msg = train_model() if saved else (False, 'no new images')
+    return jsonify({'ok': True, 'msg': f'saved {saved} images; retrain: {trained} - {msg}', 'saved': saved, 'skipped': skipped})
+
 @app.route('/attendance/mark', methods=['POST'])
 def mark_attendance():
     # Accepts 'frame' file (image) and 'username' (both required)
+    username = request.form.get('username')
+    frame = request.files.get('frame')
+    if not username or not frame:
+        return jsonify({'ok': False, 'msg': 'Both username and frame are required'}), 400
+    try:
+        # Duplicates are rejected before any image work
+        if username in marked_today:
+            MARK_SHORTCIRCUIT.inc(reason='already_marked')
+            return jsonify({'ok': False, 'msg': f'Attendance already marked for {username} today'}), 400
+        # Decode up front so a resubmitted frame can be answered from the verdict cache;
+        # decode errors are reported at their usual place below
+        try:
+            with RECOGNITION_STAGE.time(stage='decode'):
+                arr = face_array(io.BytesIO(frame.read()))
+        except Exception:
+            arr = None
+        # load model for face recognition (for confidence only)
+        with RECOGNITION_STAGE.time(stage='model_load'):
+            recognizer = load_recognizer()
+        cache_key = None
+        if arr is not None and recognizer is not None:
+            cache_key = (username, frame_hash(arr), recognizer.version)
+            cached = verdict_cache.get(cache_key)
+            if cached is not None:
+                MARK_SHORTCIRCUIT.inc(reason='cached_verdict')
+                body, status = cached
+                return jsonify(dict(body, cached=True)), status
+    except Exception as e:
+        return jsonify({'ok': False, 'msg': str(e)}), 500
     db = SessionLocal()
     try:
-        username = request.form.get('username')
-        frame = request.files.get('frame')
-        if not username or not frame:
-            db.close()
-            return jsonify({'ok': False, 'msg': 'Both username and frame are required'}), 400
         # Find user and profile for the selected username
         user = db.query(User).filter_by(username=username).first()
         if not user:
@@ -823,50 +1359,189 @@ def mark_attendance():
             Attendance.student_id == profile.profile_id,
             Attendance.attendance_date == today
         ).first()
-        # load model for face recognition (for confidence only)
-        if not os.path.exists(MODEL_PATH):
+        if recognizer is None:
             db.close()
             return jsonify({'ok': False, 'msg': 'Model not trained yet. Add students first.'}), 400
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        recognizer.read(MODEL_PATH)
-        try:
-            img = Image.open(io.BytesIO(frame.read())).convert('L').resize((200,200))
-            arr = np.array(img, dtype=np.uint8)
-        except Exception as e:
+        if arr is None:
             db.close()
             return jsonify({'ok': False, 'msg': 'Invalid image'}), 400
-        label, conf = recognizer.predict(arr)
-        # Map label to username
-        label_mapping = get_label_mapping()
-        inv_label_mapping = {v: k for k, v in label_mapping.items()}
+        with RECOGNITION_STAGE.time(stage='predict'):
+            label, conf = recognizer.predict(arr)
+        RECOGNITION_CONFIDENCE.observe(conf)
+        model_version = recognizer.version
+        # Map label to username with the label map the model was trained with
+        inv_label_mapping = {v: k for k, v in recognizer.label_map.items()}
         predicted_username = inv_label_mapping.get(label)
 
         if already_marked:
             db.close()
-            return jsonify({'ok': False, 'msg': f'Attendance already marked for {username} today', 'conf': float(conf)}), 400
+            marked_today.add(username, today)
+            return jsonify({'ok': False, 'msg': f'Attendance already marked for {username} today', 'conf': float(conf), 'model_version': model_version}), 400
 
         # Check if predicted username matches selected username and confidence is good
+        verdict = None
         if predicted_username != username:
+            verdict = {'ok': False, 'msg': f'Face does not match selected student. Detected: {predicted_username}', 'conf': float(conf), 'model_version': model_version}
+        elif conf > 70:
+            verdict = {'ok': False, 'msg': f'Face not recognized confidently (conf={conf:.2f}). Try again.', 'conf': float(conf), 'model_version': model_version}
+        if verdict is not None:
             db.close()
-            return jsonify({'ok': False, 'msg': f'Face does not match selected student. Detected: {predicted_username}', 'conf': float(conf)}), 400
-        if conf > 70:
-            db.close()
-            return jsonify({'ok': False, 'msg': f'Face not recognized confidently (conf={conf:.2f}). Try again.', 'conf': float(conf)}), 400
+            verdict_cache.put(cache_key, (verdict, 400))
+            return jsonify(verdict), 400
 
-        att = Attendance(
-            student_id=profile.profile_id,
-            attendance_date=today,
-            status='Present'
-        )
-        db.add(att)
-        db.commit()
+        with RECOGNITION_STAGE.time(stage='db_write'):
+            att = Attendance(
+                student_id=profile.profile_id,
+                attendance_date=today,
+                status='Present'
+            )
+            db.add(att)
+            db.commit()
         db.close()
-        return jsonify({'ok': True, 'msg': f'Attendance marked for {username}', 'conf': float(conf)})
+        marked_today.add(username, today)
+        return jsonify({'ok': True, 'msg': f'Attendance marked for {username}', 'conf': float(conf), 'model_version': model_version})
     except Exception as e:
         db.rollback()
         db.close()
         return jsonify({'ok': False, 'msg': str(e)}), 500
 
+# Streamed attendance sessions: POST /attendance/session/start, then batches of frames to
+# /attendance/session/<id>/frames until the response says stop
+SESSION_SAMPLE_EVERY = int(os.environ.get('SESSION_SAMPLE_EVERY', '2'))
+SESSION_MIN_VOTES = int(os.environ.get('SESSION_MIN_VOTES', '2'))
+SESSION_CONF_THRESHOLD = float(os.environ.get('SESSION_CONF_THRESHOLD', '70'))
+SESSION_MAX_FRAMES = int(os.environ.get('SESSION_MAX_FRAMES', '30'))
+# Per-request limits for /attendance/session/<id>/frames
+SESSION_MAX_BATCH_FRAMES = int(os.environ.get('SESSION_MAX_BATCH_FRAMES', '10'))
+SESSION_MAX_BATCH_BYTES = int(os.environ.get('SESSION_MAX_BATCH_BYTES', str(5 * 1024 * 1024)))
+attendance_sessions = attendance_session.SessionStore(float(os.environ.get('SESSION_TTL_SECONDS', '120')))
+session_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('SESSION_WORKERS', '2')), thread_name_prefix='recognize')
+
+def _recognize_frame(recognizer, data):
+    try:
+        arr = face_array(io.BytesIO(data))
+    except Exception:
+        return None
+    return recognizer.predict(arr)
+
+def _record_session_attendance(session):
+    # Returns False if another request marked the student first
+    db = SessionLocal()
+    try:
+        today = datetime.date.today()
+        already_marked = db.query(Attendance).filter(
+            Attendance.student_id == session.profile_id,
+            Attendance.attendance_date == today
+        ).first()
+        if not already_marked:
+            db.add(Attendance(student_id=session.profile_id, attendance_date=today, status='Present'))
+            db.commit()
+        marked_today.add(session.username, today)
+        return not already_marked
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@app.route('/attendance/session/start', methods=['POST'])
+def start_attendance_session():
+    # Accepts 'username' (form or JSON)
+    data = request.get_json(silent=True) or request.form
+    username = data.get('username')
+    if not username:
+        return jsonify({'ok': False, 'msg': 'username is required'}), 400
+    db = SessionLocal()
+    try:
+        if username in marked_today:
+            return jsonify({'ok': False, 'msg': f'Attendance already marked for {username} today'}), 400
+        user = db.query(User).filter_by(username=username).first()
+        if not user:
+            return jsonify({'ok': False, 'msg': 'User not found'}), 404
+        profile = db.query(Profile).filter_by(user_id=user.user_id).first()
+        if not profile:
+            return jsonify({'ok': False, 'msg': 'Profile not found'}), 404
+        user_dir = os.path.join(UPLOAD_FOLDER, username)
+        if not os.path.isdir(user_dir) or len(os.listdir(user_dir)) == 0:
+            return jsonify({'ok': False, 'msg': 'Face ID not added for this student. Please add Face ID first.'}), 400
+        if load_recognizer() is None:
+            return jsonify({'ok': False, 'msg': 'Model not trained yet. Add students first.'}), 400
+        session = attendance_sessions.add(attendance_session.RecognitionSession(
+            username, profile.profile_id, SESSION_SAMPLE_EVERY, SESSION_MIN_VOTES, SESSION_CONF_THRESHOLD, SESSION_MAX_FRAMES))
+        return jsonify({'ok': True, 'session_id': session.id, 'sample_every': session.sample_every,
+                        'min_votes': session.min_votes, 'conf_threshold': session.conf_threshold,
+                        'max_frames': session.max_frames})
+    except Exception as e:
+        return jsonify({'ok': False, 'msg': str(e)}), 500
+    finally:
+        db.close()
+
+@app.route('/attendance/session/<session_id>/frames', methods=['POST'])
+def attendance_session_frames(session_id):
+    # Accepts one or more 'frame' files; processes the sampled ones and stops at the first decisive result
+    session = attendance_sessions.get(session_id)
+    if session is None:
+        return jsonify({'ok': False, 'msg': 'Session not found or expired', 'stop': True}), 404
+    if request.content_length is None or request.content_length > SESSION_MAX_BATCH_BYTES:
+        return jsonify({'ok': False, 'msg': f'Frame batch must be sent with a Content-Length of at most {SESSION_MAX_BATCH_BYTES} bytes'}), 413
+    frames = request.files.getlist('frame')
+    if not frames:
+        return jsonify({'ok': False, 'msg': 'frame is required'}), 400
+    if len(frames) > SESSION_MAX_BATCH_FRAMES:
+        return jsonify({'ok': False, 'msg': f'At most {SESSION_MAX_BATCH_FRAMES} frames per batch'}), 413
+    try:
+        with session.lock:
+            if session.status != attendance_session.ACTIVE:
+                return jsonify(dict(session.summary(), ok=session.status == attendance_session.MATCHED))
+            picked = session.sample(len(frames))
+            SESSION_FRAMES.inc(len(frames) - len(picked), result='skipped')
+            recognizer = load_recognizer()
+            if recognizer is None:
+                return jsonify({'ok': False, 'msg': 'Model not trained yet. Add students first.', 'stop': True}), 400
+            inv_label_mapping = {v: k for k, v in recognizer.label_map.items()}
+            futures = [session_executor.submit(_recognize_frame, recognizer, frames[i].read()) for i in picked]
+            try:
+                for future in futures:
+                    result = future.result()
+                    if result is None:
+                        SESSION_FRAMES.inc(result='invalid')
+                        continue
+                    SESSION_FRAMES.inc(result='processed')
+                    label, conf = result
+                    RECOGNITION_CONFIDENCE.observe(conf)
+                    if session.record(inv_label_mapping.get(label), conf, recognizer.version) != attendance_session.ACTIVE:
+                        break
+            finally:
+                # Frames queued behind a decisive result are never run
+                for future in futures:
+                    future.cancel()
+            body = session.summary()
+            if session.status == attendance_session.MATCHED:
+                try:
+                    newly_marked = _record_session_attendance(session)
+                except Exception:
+                    # Nothing was recorded: keep the session open so the client retries
+                    # instead of being told to stop
+                    session.status = attendance_session.ACTIVE
+                    raise
+                body['msg'] = f'Attendance marked for {session.username}' if newly_marked else f'Attendance already marked for {session.username} today'
+            elif session.status == attendance_session.FAILED:
+                body['msg'] = 'Face not recognized confidently. Try again.'
+            if session.status != attendance_session.ACTIVE:
+                SESSION_OUTCOMES.inc(outcome=session.status)
+            return jsonify(dict(body, ok=session.status != attendance_session.FAILED))
+    except Exception as e:
+        return jsonify({'ok': False, 'msg': str(e)}), 500
+
+@app.route('/attendance/session/<session_id>', methods=['DELETE'])
+def end_attendance_session(session_id):
+    session = attendance_sessions.remove(session_id)
+    if session is None:
+        return jsonify({'ok': False, 'msg': 'Session not found or expired'}), 404
+    if session.status == attendance_session.ACTIVE:
+        SESSION_OUTCOMES.inc(outcome='cancelled')
+    return jsonify(dict(session.summary(), ok=True))
+
 # API to get attendance records for a student by username and date interval (all roles)
 @app.route('/attendance/get-records', methods=['POST'])
 def get_attendance_records():
@@ -900,8 +1575,21 @@ def get_attendance_records():
                 'attendance_id': r.attendance_id,
                 'attendance_date': r.attendance_date.isoformat(),
                 'status': r.status,
-                'remarks': r.remarks
+                'remarks': r.remarks,
+                'archived': False
             })
+        # Closed academic years come from the archive (no attendance_id); a hot row for the
+        # same day takes precedence
+        hot_dates = {r.attendance_date for r in records}
+        archived = [{
+            'attendance_id': None,
+            'attendance_date': date.isoformat(),
+            'status': status,
+            'remarks': remarks,
+            'archived': True
+        } for date, status, remarks in archived_attendance(db, profile.profile_id, start_dt, end_dt) if date not in hot_dates]
+        if archived:
+            result = sorted(archived + result, key=lambda r: r['attendance_date'])
         return jsonify({'ok': True, 'records': result})
     except Exception as e:
         return jsonify({'ok': False, 'msg': str(e)}), 500
@@ -911,8 +1599,122 @@ def get_attendance_records():
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    return send_stored_file(UPLOAD_FOLDER, filename)
+
+# CLI: flask --app app import-students roster.csv
+@app.cli.command('import-students')
+@click.argument('roster_path', type=click.Path(exists=True, dir_okay=False))
+def import_students_command(roster_path):
+    with open(roster_path, 'rb') as f:
+        rows = read_roster_csv(f)
+    db = SessionLocal()
+    try:
+        created, skipped = import_student_roster(db, rows)
+    finally:
+        db.close()
+    click.echo(f'Imported {len(created)} students, skipped {len(skipped)}')
+    for s in skipped:
+        click.echo(f"  row {s['row']} ({s['username']}): {s['msg']}")
+
+# CLI: flask --app app import-faces faces.zip
+@app.cli.command('import-faces')
+@click.argument('archive_path', type=click.Path(exists=True, dir_okay=False))
+def import_faces_command(archive_path):
+    db = SessionLocal()
+    try:
+        saved, skipped = import_face_archive(db, archive_path, _profile_ids_by_username(db))
+    finally:
+        db.close()
+    for s in skipped:
+        click.echo(f"  skipped {s['file']}: {s['msg']}")
+    trained, msg = train_model() if saved else (False, 'no new images')
+    click.echo(f'saved {saved} images; retrain: {trained} - {msg}')
+
+# CLI: flask --app app normalize-faces
+# Moves images saved before content-addressed storage (uploads/<username>/<label>_<id>.jpg)
+# into the normalized layout and records them, then retrains once
+@app.cli.command('normalize-faces')
+def normalize_faces_command():
+    db = SessionLocal()
+    converted = duplicates = 0
+    try:
+        profile_ids = _profile_ids_by_username(db)
+        for username in sorted(os.listdir(UPLOAD_FOLDER)):
+            user_dir = os.path.join(UPLOAD_FOLDER, username)
+            if not os.path.isdir(user_dir):
+                continue
+            if username not in profile_ids:
+                click.echo(f'  skipped {username}/: no such user')
+                continue
+            recorded = {f for (f,) in db.query(FaceImage.file_name).filter_by(student_id=profile_ids[username])}
+            for fname in sorted(os.listdir(user_dir)):
+                path = os.path.join(user_dir, fname)
+                if fname.startswith('.') or fname in recorded or not os.path.isfile(path):
+                    continue
+                with open(path, 'rb') as f:
+                    data = f.read()
+                try:
+                    image, created = enroll_face_image(db, username, profile_ids[username], data, fname.split('_')[0])
+                except (OSError, ValueError):
+                    click.echo(f'  skipped {username}/{fname}: not a readable image')
+                    continue
+                db.commit()
+                recorded.add(image.file_name)
+                if image.file_name != fname:
+                    os.remove(path)
+                converted += created
+                duplicates += not created
+    finally:
+        db.close()
+    trained, msg = train_model() if converted or duplicates else (False, 'nothing to convert')
+    click.echo(f'normalized {converted} images, removed {duplicates} duplicates; retrain: {trained} - {msg}')
+
+# CLI: flask --app app archive-attendance [--year 2024]
+# Without --year, every closed academic year still in the attendance table is archived
+@app.cli.command('archive-attendance')
+@click.option('--year', type=int, help='academic year to archive, labelled by the year it starts in')
+def archive_attendance_command(year):
+    current = attendance_archive.academic_year_of(datetime.date.today(), ACADEMIC_YEAR_START_MONTH)
+    if year is not None and year >= current:
+        raise click.BadParameter(f'academic year {year} is not closed yet', param_hint='--year')
+    db = SessionLocal()
+    try:
+        if year is None:
+            oldest = db.query(func.min(Attendance.attendance_date)).scalar()
+            years = range(attendance_archive.academic_year_of(oldest, ACADEMIC_YEAR_START_MONTH), current) if oldest else []
+        else:
+            years = [year]
+        for y in years:
+            students, moved = archive_attendance_year(db, y)
+            if moved:
+                click.echo(f'{y}-{y + 1}: archived {moved} records for {students} students')
+    finally:
+        db.close()
+
+# CLI: flask --app app convert-model [lbph_model.yml]
+@app.cli.command('convert-model')
+@click.argument('yaml_path', required=False, type=click.Path(exists=True, dir_okay=False))
+def convert_model_command(yaml_path):
+    import lbph
+    manifest = lbph.convert_yaml_model(yaml_path or LEGACY_MODEL_PATH, MODEL_DIR, get_label_mapping())
+    click.echo(f"published {manifest['samples']} histograms as model {manifest['version']} in {MODEL_DIR}")
+
+# CLI: flask --app app train-model
+# Rebuilds the model from uploads/ and publishes it as a new version
+@app.cli.command('train-model')
+def train_model_command():
+    trained, msg = train_model()
+    click.echo(msg)
+    if not trained:
+        raise SystemExit(1)
+
+# CLI: flask --app app init-db
+@app.cli.command('init-db')
+def init_db_command():
+    init_db()
+    click.echo(f'Initialized database at {DB_PATH}')
 
 if __name__=='__main__':
-    print('Starting backend with OpenCV LBPH face recognition (no dlib required).')
+    init_db()
+    print('Starting backend with LBPH face recognition (NumPy, no dlib or OpenCV required).')
     app.run(debug=True)
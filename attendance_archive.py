@@ -0,0 +1,83 @@
+# attendance_archive.py
+# Compact storage for closed academic years. One student's year becomes a single
+# attendance_archive row instead of ~365 attendance rows. The row holds three day bitmaps
+# (bit i = start + i days): a day was recorded, was Present, or was Leave. A recorded day
+# with neither bit set is Absent. Remarks are rare, so they are kept as a small JSON object
+# keyed by day offset.
+import datetime, json
+
+PRESENT, ABSENT, LEAVE = 'Present', 'Absent', 'Leave'
+
+
+def academic_year_of(date, start_month):
+    # An academic year is labelled by the calendar year it starts in
+    return date.year if date.month >= start_month else date.year - 1
+
+
+def academic_year_bounds(year, start_month):
+    start = datetime.date(year, start_month, 1)
+    end = datetime.date(year + 1, start_month, 1) - datetime.timedelta(days=1)
+    return start, end
+
+
+def _bitmap(days):
+    return bytearray((days + 7) // 8)
+
+
+def _is_set(bitmap, i):
+    return bitmap[i >> 3] >> (i & 7) & 1
+
+
+def _set(bitmap, i):
+    bitmap[i >> 3] |= 1 << (i & 7)
+
+
+def encode(start, end, records):
+    # records: iterable of (date, status, remarks) inside [start, end]; later entries for
+    # the same date win. Returns the column values of an archive row.
+    days = (end - start).days + 1
+    by_offset = {}
+    for date, status, remarks in records:
+        offset = (date - start).days
+        if not 0 <= offset < days:
+            raise ValueError(f'{date} is outside {start}..{end}')
+        by_offset[offset] = (status, remarks)
+    recorded, present, leave = _bitmap(days), _bitmap(days), _bitmap(days)
+    notes = {}
+    for offset, (status, remarks) in by_offset.items():
+        _set(recorded, offset)
+        if status == PRESENT:
+            _set(present, offset)
+        elif status == LEAVE:
+            _set(leave, offset)
+        if remarks:
+            notes[str(offset)] = remarks
+    return {
+        'start_date': start,
+        'end_date': end,
+        'recorded_days': bytes(recorded),
+        'present_days': bytes(present),
+        'leave_days': bytes(leave),
+        'day_count': len(by_offset),
+        'remarks': json.dumps(notes, sort_keys=True) if notes else None,
+    }
+
+
+def decode(row, start_date=None, end_date=None):
+    # [(date, status, remarks)] of an archive row, ascending, limited to the given range
+    notes = json.loads(row.remarks) if row.remarks else {}
+    first = max(0, (start_date - row.start_date).days) if start_date else 0
+    last = min((row.end_date - row.start_date).days, (end_date - row.start_date).days) if end_date else \
+        (row.end_date - row.start_date).days
+    out = []
+    for i in range(first, last + 1):
+        if not _is_set(row.recorded_days, i):
+            continue
+        if _is_set(row.present_days, i):
+            status = PRESENT
+        elif _is_set(row.leave_days, i):
+            status = LEAVE
+        else:
+            status = ABSENT
+        out.append((row.start_date + datetime.timedelta(days=i), status, notes.get(str(i))))
+    return out
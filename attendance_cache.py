@@ -0,0 +1,84 @@
+# attendance_cache.py
+# Short-circuits for /attendance/mark retry storms:
+#   MarkedToday   usernames already marked present today, reloaded from the DB periodically so
+#                 duplicates are rejected before any image work
+#   VerdictCache  bounded LRU of failed verdicts keyed by (username, frame hash, model version),
+#                 so resubmitting the same frame does not re-run prediction and DB lookups
+import threading, time, datetime
+from collections import OrderedDict
+
+
+def frame_hash(arr):
+    # 64-bit difference hash of the normalized 200x200 grayscale frame; identical for
+    # re-encodes and tiny pixel changes of the same capture
+    from PIL import Image
+    import numpy as np
+    small = np.asarray(Image.fromarray(arr).resize((9, 8), Image.BOX), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+class VerdictCache:
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class MarkedToday:
+    # load_usernames(date) -> iterable of usernames marked for that date. Misses fall through to
+    # the DB check, so a stale set can only cost a query, never a wrong acceptance; removals are
+    # applied locally via discard() and picked up by other processes at the next refresh.
+    def __init__(self, load_usernames, refresh_seconds=60.0):
+        self.load_usernames = load_usernames
+        self.refresh_seconds = refresh_seconds
+        self._date = None
+        self._usernames = set()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _refresh_if_stale(self):
+        today = datetime.date.today()
+        now = time.monotonic()
+        if self._date == today and now - self._loaded_at < self.refresh_seconds:
+            return
+        with self._lock:
+            if self._date == today and now - self._loaded_at < self.refresh_seconds:
+                return
+            usernames = set(self.load_usernames(today))
+            self._date, self._usernames, self._loaded_at = today, usernames, now
+
+    def __contains__(self, username):
+        self._refresh_if_stale()
+        return username in self._usernames
+
+    def add(self, username, date=None):
+        if date is None or date == self._date:
+            self._usernames.add(username)
+
+    def discard(self, username):
+        self._usernames.discard(username)
+
+    def invalidate(self):
+        self._loaded_at = None
+        self._date = None
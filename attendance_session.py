@@ -0,0 +1,92 @@
+# attendance_session.py
+# State for streamed attendance: the client posts low-resolution frames in small batches to one
+# session, the server samples every Nth frame, and votes accumulate until enough confident matches
+# (or the frame budget is spent). Sessions live in process memory, so with several app servers
+# route a session's requests to the same node (sticky sessions).
+import threading, time, uuid
+
+ACTIVE, MATCHED, FAILED = 'active', 'matched', 'failed'
+
+
+class RecognitionSession:
+    def __init__(self, username, profile_id, sample_every=2, min_votes=2, conf_threshold=70.0, max_frames=30):
+        self.id = uuid.uuid4().hex
+        self.username = username
+        self.profile_id = profile_id
+        self.sample_every = max(1, sample_every)
+        self.min_votes = max(1, min_votes)
+        self.conf_threshold = conf_threshold
+        self.max_frames = max_frames
+        self.status = ACTIVE
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.votes = 0
+        self.best_conf = None
+        self.model_version = None
+        self.lock = threading.Lock()
+        self.touched_at = time.monotonic()
+
+    def sample(self, count):
+        # Indexes within this batch to process; the stride carries over between batches, and
+        # no more are picked than the remaining max_frames budget
+        picked = [i for i in range(count) if (self.frames_received + i) % self.sample_every == 0]
+        self.frames_received += count
+        return picked[:max(0, self.max_frames - self.frames_processed)]
+
+    def record(self, predicted_username, conf, model_version=None):
+        self.frames_processed += 1
+        self.model_version = model_version
+        if predicted_username == self.username:
+            if self.best_conf is None or conf < self.best_conf:
+                self.best_conf = conf
+            if conf <= self.conf_threshold:
+                self.votes += 1
+        if self.votes >= self.min_votes:
+            self.status = MATCHED
+        elif self.frames_processed >= self.max_frames:
+            self.status = FAILED
+        return self.status
+
+    def summary(self):
+        return {
+            'session_id': self.id,
+            'username': self.username,
+            'status': self.status,
+            'stop': self.status != ACTIVE,
+            'frames_received': self.frames_received,
+            'frames_processed': self.frames_processed,
+            'votes': self.votes,
+            'min_votes': self.min_votes,
+            'best_conf': self.best_conf,
+            'model_version': self.model_version,
+        }
+
+
+class SessionStore:
+    def __init__(self, ttl_seconds=120.0):
+        self.ttl_seconds = ttl_seconds
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        for sid in [sid for sid, s in self._sessions.items() if now - s.touched_at > self.ttl_seconds]:
+            del self._sessions[sid]
+
+    def add(self, session):
+        with self._lock:
+            self._expire(time.monotonic())
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.touched_at = now
+            return session
+
+    def remove(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
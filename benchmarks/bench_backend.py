@@ -0,0 +1,229 @@
+# Reproducible backend benchmark on synthetic data, run offline through Flask's test client.
+# For each scale (students x images per student) a fresh database, uploads folder and model store
+# are generated in a temp directory, then train_model, /attendance/mark (cold and warm model),
+# the list endpoints (rebuilt and cached), /attendance/get-records and
+# /admin/mark-attendance-manual are timed.
+#
+# Usage:
+#   python benchmarks/bench_backend.py --scales 20x3,100x5 --days 365 --repeat 5 --output bench_results.json
+#   python benchmarks/bench_backend.py --baseline previous.json   # also print change vs an earlier run
+import os, sys, io, json, time, argparse, datetime, platform, statistics, subprocess, tempfile, shutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN = {'Authorization': 'demo-admin', 'username': 'admin'}
+# Served from app.response_cache
+CACHED_ROUTES = ('/admin/get-student-list', '/admin/get-teacher-list')
+
+
+def synthetic_faces(rng, count):
+    # One smooth random "identity" per student, with per-image noise, shift and brightness jitter
+    import numpy as np
+    from PIL import Image
+    base = Image.fromarray(rng.integers(0, 256, (20, 20), dtype=np.uint8)).resize((200, 200), Image.BILINEAR)
+    base = np.asarray(base, dtype=np.float32)
+    for _ in range(count):
+        img = np.roll(base, tuple(rng.integers(-4, 5, 2)), axis=(0, 1))
+        img = img * rng.uniform(0.85, 1.15) + rng.normal(0, 8, img.shape)
+        buf = io.BytesIO()
+        Image.fromarray(np.clip(img, 0, 255).astype(np.uint8)).save(buf, format='JPEG', quality=90)
+        yield buf.getvalue()
+
+
+def populate(app_module, students, images, days, seed):
+    import numpy as np
+    from sqlalchemy import insert
+    from models import Attendance, Profile, User
+    rng = np.random.default_rng(seed)
+    usernames = [f'student{i:05d}' for i in range(students)]
+    rows = [{'username': u, 'password': 'pw', 'first_name': 'Synthetic', 'last_name': u, 'email_id': f'{u}@example.com'}
+            for u in usernames]
+    db = app_module.SessionLocal()
+    try:
+        app_module.import_student_roster(db, rows)
+        profile_ids = [pid for (pid,) in db.query(Profile.profile_id).join(User, User.user_id == Profile.user_id)
+                       .filter(User.username.in_(usernames))]
+        # A year of weekday attendance ending yesterday, so today is still unmarked
+        today = datetime.date.today()
+        dates = [today - datetime.timedelta(days=d) for d in range(days, 0, -1)]
+        dates = [d for d in dates if d.weekday() < 5]
+        statuses = rng.choice(['Present', 'Absent', 'Leave'], size=(len(profile_ids), len(dates)), p=[0.9, 0.07, 0.03])
+        batch = []
+        for pid, row in zip(profile_ids, statuses):
+            batch.extend({'student_id': pid, 'attendance_date': d, 'status': s} for d, s in zip(dates, row))
+            if len(batch) >= 20000:
+                db.execute(insert(Attendance), batch)
+                batch = []
+        if batch:
+            db.execute(insert(Attendance), batch)
+        db.commit()
+    finally:
+        db.close()
+    frames = {}
+    for username in usernames:
+        user_dir = os.path.join(app_module.UPLOAD_FOLDER, username)
+        os.makedirs(user_dir, exist_ok=True)
+        for j, data in enumerate(synthetic_faces(rng, images + 1)):
+            if j == images:
+                frames[username] = data  # held-out probe for /attendance/mark
+                continue
+            with open(os.path.join(user_dir, f'front_{j:03d}.jpg'), 'wb') as f:
+                f.write(data)
+    return usernames, frames, len(dates)
+
+
+def measure(name, fn, repeat):
+    import query_stats
+    times, queries, statuses = [], [], []
+    for i in range(repeat):
+        with query_stats.count_queries() as recorder:
+            start = time.perf_counter()
+            status = fn(i)
+            times.append(time.perf_counter() - start)
+        queries.append(recorder.count)
+        statuses.append(status)
+    return {
+        'operation': name,
+        'runs': repeat,
+        'min_ms': min(times) * 1e3,
+        'median_ms': statistics.median(times) * 1e3,
+        'mean_ms': statistics.fmean(times) * 1e3,
+        'max_ms': max(times) * 1e3,
+        'queries': statistics.median(queries),
+        'statuses': sorted(set(statuses), key=str),
+    }
+
+
+def run_scale(students, images, days, repeat, seed):
+    # Runs inside a worker process whose environment points app.py at a scratch directory
+    import app
+    app.init_db()
+    client = app.app.test_client()
+    setup_start = time.perf_counter()
+    usernames, frames, attendance_days = populate(app, students, images, days, seed)
+    setup_seconds = time.perf_counter() - setup_start
+    repeat_marks = max(1, min(repeat, len(usernames) // 2))
+    results = [measure('train_model', lambda i: app.train_model()[0], repeat)]
+
+    def mark(username):
+        data = {'username': username, 'frame': (io.BytesIO(frames[username]), 'frame.jpg')}
+        return client.post('/attendance/mark', data=data, content_type='multipart/form-data').status_code
+
+    def mark_cold(i):
+        app._model_registry = None  # drop the in-process model so the request has to load it
+        return mark(usernames[i])
+
+    results.append(measure('attendance_mark_cold', mark_cold, repeat_marks))
+    results.append(measure('attendance_mark_warm', lambda i: mark(usernames[repeat_marks + i]), repeat_marks))
+    for route in ('/admin/get-student-list', '/admin/get-teacher-list', '/admin/get-all-student-usernames'):
+        get = lambda r=route: client.get(r, headers=ADMIN).status_code
+        if route not in CACHED_ROUTES:
+            results.append(measure(route, lambda i, get=get: get(), repeat))
+            continue
+        # The plain row rebuilds the body every time so it stays comparable with runs from
+        # before the response cache; the "(cached)" row measures warm hits
+        def cold(i, get=get):
+            app.response_cache.clear()
+            return get()
+        results.append(measure(route, cold, repeat))
+        get()
+        results.append(measure(f'{route} (cached)', lambda i, get=get: get(), repeat))
+    year = {'start_date': (datetime.date.today() - datetime.timedelta(days=days)).isoformat(),
+            'end_date': datetime.date.today().isoformat()}
+    results.append(measure('/attendance/get-records', lambda i: client.post(
+        '/attendance/get-records', json=dict(year, username=usernames[i % len(usernames)])).status_code, repeat))
+    results.append(measure('/admin/mark-attendance-manual', lambda i: client.post(
+        '/admin/mark-attendance-manual', headers=ADMIN,
+        json={'usernames': usernames, 'date': (datetime.date.today() + datetime.timedelta(days=i + 1)).isoformat()}
+    ).status_code, repeat))
+    for r in results:
+        r.update(students=students, images_per_student=images, attendance_days=attendance_days)
+    return {'students': students, 'images_per_student': images, 'setup_seconds': setup_seconds, 'results': results}
+
+
+def spawn_worker(students, images, args):
+    work = tempfile.mkdtemp(prefix='attendance_bench_')
+    env = dict(os.environ,
+               DB_PATH=os.path.join(work, 'database.db'),
+               UPLOAD_FOLDER=os.path.join(work, 'uploads'),
+               ANNOUNCEMENT_IMAGE_FOLDER=os.path.join(work, 'announcement_images'),
+               MODEL_STORE_DIR=os.path.join(work, 'model'),
+               SLOW_QUERY_MS='1e9')
+    cmd = [sys.executable, os.path.abspath(__file__), '--worker', '--students', str(students), '--images', str(images),
+           '--days', str(args.days), '--repeat', str(args.repeat), '--seed', str(args.seed)]
+    try:
+        out = subprocess.run(cmd, cwd=ROOT, env=env, check=True, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    previous = {}
+    for r in (baseline or {}).get('results', []):
+        previous[(r['students'], r['images_per_student'], r['operation'])] = r
+    print(f"{'scale':>10} {'operation':<32} {'median ms':>10} {'min ms':>9} {'queries':>8} {'vs baseline':>12}")
+    for r in report['results']:
+        scale = f"{r['students']}x{r['images_per_student']}"
+        change = ''
+        old = previous.get((r['students'], r['images_per_student'], r['operation']))
+        if old and old['median_ms']:
+            change = f"{(r['median_ms'] / old['median_ms'] - 1) * 100:+.1f}%"
+        print(f"{scale:>10} {r['operation']:<32} {r['median_ms']:>10.2f} {r['min_ms']:>9.2f} {r['queries']:>8g} {change:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', default='20x3,100x5', help='comma-separated <students>x<images per student>')
+    parser.add_argument('--days', type=int, default=365, help='days of attendance history per student')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--students', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--images', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, ROOT)
+        print(json.dumps(run_scale(args.students, args.images, args.days, args.repeat, args.seed)))
+        return
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': {'scales': args.scales, 'days': args.days, 'repeat': args.repeat, 'seed': args.seed},
+        },
+        'scales': [],
+        'results': [],
+    }
+    for scale in args.scales.split(','):
+        students, images = (int(x) for x in scale.lower().split('x'))
+        print(f'running {students} students x {images} images ...', file=sys.stderr)
+        outcome = spawn_worker(students, images, args)
+        report['scales'].append({k: outcome[k] for k in ('students', 'images_per_student', 'setup_seconds')})
+        report['results'].extend(outcome['results'])
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
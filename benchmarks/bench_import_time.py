@@ -0,0 +1,53 @@
+# Measure how long `import app` takes in a fresh interpreter and check that heavy modules stay unloaded.
+# Usage: python benchmarks/bench_import_time.py [--repeat 5] [--max-ms 0]
+import os, sys, json, time, argparse, subprocess, statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('cv2', 'numpy', 'PIL', 'lbph')
+
+PROBE = f"""
+import sys, json, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'heavy_loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=0, help='fail if the median import time exceeds this')
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, check=True, capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result['process_seconds'] = wall
+        runs.append(result)
+
+    import_ms = statistics.median(r['seconds'] for r in runs) * 1e3
+    process_ms = statistics.median(r['process_seconds'] for r in runs) * 1e3
+    print(f'import app      median {import_ms:8.1f} ms')
+    print(f'python -c       median {process_ms:8.1f} ms (interpreter start + import)')
+    heavy = sorted({m for r in runs for m in r['heavy_loaded']})
+    print(f'heavy modules loaded at import: {heavy or "none"}')
+
+    failed = False
+    if heavy:
+        print('FAIL: heavy modules should load lazily on the recognition/training path')
+        failed = True
+    if args.max_ms and import_ms > args.max_ms:
+        print(f'FAIL: import time above {args.max_ms} ms')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
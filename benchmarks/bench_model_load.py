@@ -0,0 +1,70 @@
+# Compare write/load time of the legacy LBPH YAML model and the binary lbph model directory.
+# Usage: python benchmarks/bench_model_load.py [--samples 200] [--repeat 5] [--yaml lbph_model.yml]
+import os, sys, time, argparse, tempfile, shutil
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import lbph
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=200, help='synthetic training images when --yaml is not given')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--yaml', help='benchmark an existing recognizer.write() model instead')
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='lbph_bench_')
+    try:
+        run(args, work)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def run(args, work):
+    import cv2
+    yaml_path = os.path.join(work, 'model.yml')
+    model_dir = os.path.join(work, 'model')
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    if args.yaml:
+        recognizer.read(args.yaml)
+    else:
+        rng = np.random.default_rng(0)
+        faces = [rng.integers(0, 256, (200, 200), dtype=np.uint8) for _ in range(args.samples)]
+        recognizer.train(faces, np.arange(args.samples, dtype=np.int32) // 5 + 1)
+
+    write_yaml = timed(lambda: recognizer.write(yaml_path), args.repeat)
+    histograms, labels = lbph.recognizer_histograms(recognizer), recognizer.getLabels()
+    write_bin = timed(lambda: lbph.save_model(model_dir, histograms, labels, lbph.recognizer_params(recognizer)), args.repeat)
+
+    def read_yaml():
+        cv2.face.LBPHFaceRecognizer_create().read(yaml_path)
+
+    def read_bin():
+        # Touch every page so the memory map is actually read from disk/cache
+        float(np.asarray(lbph.load_model(model_dir).histograms).sum())
+
+    load_yaml = timed(read_yaml, args.repeat)
+    load_bin = timed(read_bin, args.repeat)
+    samples = len(lbph.load_model(model_dir))
+    print(f'samples: {samples}')
+    print(f'size   yaml {os.path.getsize(yaml_path) / 1e6:8.2f} MB   binary {dir_size(model_dir) / 1e6:8.2f} MB')
+    print(f'write  yaml {write_yaml * 1e3:8.1f} ms   binary {write_bin * 1e3:8.1f} ms')
+    print(f'load   yaml {load_yaml * 1e3:8.1f} ms   binary {load_bin * 1e3:8.1f} ms   ({load_yaml / load_bin:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# face_store.py
+# Enrollment images are normalized on ingest: EXIF orientation applied, downscaled so the longer
+# side is at most max_side, and re-encoded as JPEG at a fixed quality. Each one is stored as
+# <user_dir>/<sha256 of the normalized bytes>.jpg, so an identical resubmission maps to the
+# same file, and training decodes small files instead of full-resolution phone captures.
+import hashlib, io, os, uuid
+
+MAX_SIDE = 400
+JPEG_QUALITY = 90
+
+
+def normalize_image(data, max_side=MAX_SIDE, quality=JPEG_QUALITY):
+    # Raw upload bytes -> (jpeg bytes, (width, height)); raises PIL's errors on undecodable input
+    from PIL import Image, ImageOps
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('L' if img.mode in ('1', 'L', 'LA', 'I', 'I;16', 'F') else 'RGB')
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=quality, optimize=True)
+        return buf.getvalue(), img.size
+
+
+def content_name(content_hash):
+    return f'{content_hash}.jpg'
+
+
+def store_image(user_dir, data, max_side=MAX_SIDE, quality=JPEG_QUALITY):
+    # Normalize and write once; returns a dict describing the stored file. 'created' is False
+    # when a file with the same content was already there.
+    normalized, (width, height) = normalize_image(data, max_side, quality)
+    content_hash = hashlib.sha256(normalized).hexdigest()
+    file_name = content_name(content_hash)
+    path = os.path.join(user_dir, file_name)
+    created = not os.path.exists(path)
+    if created:
+        os.makedirs(user_dir, exist_ok=True)
+        tmp = os.path.join(user_dir, f'.{file_name}.{uuid.uuid4().hex[:8]}')
+        with open(tmp, 'wb') as f:
+            f.write(normalized)
+        os.replace(tmp, path)
+    return {'content_hash': content_hash, 'file_name': file_name, 'width': width, 'height': height,
+            'byte_size': len(normalized), 'created': created}
@@ -0,0 +1,66 @@
+# image_variants.py
+# Content-addressed image storage with pre-rendered variants. An upload is kept as
+# <sha256>.<ext>, and each variant is rendered once at upload time as <sha256>_<variant>.jpg.
+# Because a name only ever refers to one content, the files can be served as immutable and
+# the same upload is stored only once.
+import hashlib, io, os, re, uuid
+
+# variant -> longest side in pixels
+VARIANTS = {'thumb': 320, 'medium': 1024}
+JPEG_QUALITY = 85
+FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp', 'BMP': '.bmp'}
+_CONTENT_NAME = re.compile(r'^([0-9a-f]{64})(?:_[a-z]+)?\.[a-z]+$')
+
+
+def content_hash(name):
+    # Hash part of a content-addressed file name, or None for any other name
+    match = _CONTENT_NAME.match(os.path.basename(name))
+    return match.group(1) if match else None
+
+
+def variant_name(name, variant):
+    return f'{os.path.splitext(name)[0]}_{variant}.jpg'
+
+
+def file_names(name, variants=VARIANTS):
+    # Every file stored for one upload: the original and its variants
+    return [name] + [variant_name(name, v) for v in variants]
+
+
+def _write_once(path, data):
+    if os.path.exists(path):
+        return
+    tmp = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def store_image(folder, data, variants=VARIANTS, quality=JPEG_QUALITY):
+    # Returns the stored name; raises ValueError (or PIL's OSError) for anything that is not
+    # a supported image
+    from PIL import Image, ImageOps
+    with Image.open(io.BytesIO(data)) as img:
+        ext = FORMAT_EXTENSIONS.get(img.format)
+        if ext is None:
+            raise ValueError(f'Unsupported image format: {img.format}')
+        img.load()
+        name = hashlib.sha256(data).hexdigest() + ext
+        os.makedirs(folder, exist_ok=True)
+        _write_once(os.path.join(folder, name), data)
+        base = ImageOps.exif_transpose(img)
+        if base.mode not in ('RGB', 'L'):
+            base = base.convert('RGBA')
+            flat = Image.new('RGB', base.size, (255, 255, 255))
+            flat.paste(base, mask=base.getchannel('A'))
+            base = flat
+        for variant, max_side in variants.items():
+            path = os.path.join(folder, variant_name(name, variant))
+            if os.path.exists(path):
+                continue
+            resized = base.copy()
+            resized.thumbnail((max_side, max_side), Image.LANCZOS)
+            buf = io.BytesIO()
+            resized.save(buf, format='JPEG', quality=quality, optimize=True, progressive=True)
+            _write_once(path, buf.getvalue())
+    return name
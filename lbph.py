@@ -0,0 +1,371 @@
+# lbph.py
+# LBPH face recognition in NumPy (no opencv-contrib needed) and binary, versioned model storage.
+# A model store is a (possibly shared) directory:
+#   current.json                  pointer to the published version, replaced atomically
+#   versions/<version>/
+#       histograms.npy            float32 [samples, grid_x*grid_y*2**neighbors], memory-mapped on load
+#       labels.npy                int32 [samples]
+#       manifest.json             LBPH parameters, shapes, username->label map and file checksums
+import os, json, datetime, hashlib, logging, shutil, threading, time, uuid
+import numpy as np
+
+MODEL_FORMAT = 'lbph-npy'
+MODEL_FORMAT_VERSION = 1
+HISTOGRAMS_FILE = 'histograms.npy'
+LABELS_FILE = 'labels.npy'
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'current.json'
+VERSIONS_DIR = 'versions'
+KEEP_VERSIONS = 5
+
+log = logging.getLogger(__name__)
+
+# OpenCV LBPHFaceRecognizer_create() defaults
+DEFAULT_PARAMS = {'radius': 1, 'neighbors': 8, 'grid_x': 8, 'grid_y': 8, 'threshold': float(np.finfo(np.float64).max)}
+
+_FLT_EPSILON = np.finfo(np.float32).eps
+# Added to chi-square denominators instead of masking: bins empty in both histograms give 0/tiny = 0,
+# and the smallest non-empty normalized bin (1/cell pixels) dwarfs it
+_TINY = np.float32(1e-30)
+# Upper bound for the scratch buffers of LBPHMatcher.distances()
+DISTANCE_BLOCK_BYTES = 64 * 1024 * 1024
+HISTOGRAM_BATCH = 64
+
+
+def lbp_image(img, radius=1, neighbors=8):
+    # Extended (circular, bilinear) LBP, same arithmetic as OpenCV's elbp();
+    # img is [rows, cols] or a batch [..., rows, cols]
+    src = np.asarray(img, dtype=np.float32)
+    rows, cols = src.shape[-2:]
+    h, w = rows - 2 * radius, cols - 2 * radius
+    center = src[..., radius:radius + h, radius:radius + w]
+    dst = np.zeros(center.shape, dtype=np.int32)
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / float(neighbors)))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / float(neighbors)))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty, tx = y - np.float32(fy), x - np.float32(fx)
+        one = np.float32(1)
+        w1, w2, w3, w4 = (one - tx) * (one - ty), tx * (one - ty), (one - tx) * ty, tx * ty
+
+        def at(dy, dx):
+            return src[..., radius + dy:radius + dy + h, radius + dx:radius + dx + w]
+
+        t = w1 * at(fy, fx) + w2 * at(fy, cx) + w3 * at(cy, fx) + w4 * at(cy, cx)
+        dst += ((t > center) | (np.abs(t - center) < _FLT_EPSILON)).astype(np.int32) << n
+    return dst
+
+
+def spatial_histogram(lbp, num_patterns, grid_x=8, grid_y=8):
+    # Per-cell normalized histograms concatenated row-major, as OpenCV's spatial_histogram();
+    # one bincount covers every cell of every image in the batch
+    lead = lbp.shape[:-2]
+    lbp = lbp.reshape((-1,) + lbp.shape[-2:])
+    batch = lbp.shape[0]
+    height, width = lbp.shape[1] // grid_y, lbp.shape[2] // grid_x
+    cells = lbp[:, :grid_y * height, :grid_x * width].reshape(batch, grid_y, height, grid_x, width)
+    cells = cells.transpose(0, 1, 3, 2, 4).reshape(batch, grid_y * grid_x, height * width)
+    offsets = (np.arange(batch * grid_y * grid_x, dtype=np.int64) * num_patterns).reshape(batch, -1, 1)
+    counts = np.bincount((cells + offsets).ravel(), minlength=batch * grid_y * grid_x * num_patterns)
+    hist = counts.astype(np.float32) / np.float32(height * width)
+    return hist.reshape(lead + (grid_y * grid_x * num_patterns,))
+
+
+def lbph_histogram(img, radius=1, neighbors=8, grid_x=8, grid_y=8):
+    return spatial_histogram(lbp_image(img, radius, neighbors), 2 ** neighbors, grid_x, grid_y)
+
+
+def compute_histograms(images, params=None, batch_size=HISTOGRAM_BATCH):
+    # images: sequence of equally sized uint8 arrays -> float32 [len(images), dims]
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    out = []
+    for i in range(0, len(images), batch_size):
+        batch = np.stack(images[i:i + batch_size])
+        out.append(lbph_histogram(batch, p['radius'], p['neighbors'], p['grid_x'], p['grid_y']))
+    if not out:
+        return np.zeros((0, 2 ** p['neighbors'] * p['grid_x'] * p['grid_y']), np.float32)
+    return np.ascontiguousarray(np.concatenate(out), dtype=np.float32)
+
+
+class LBPHMatcher:
+    # NumPy LBPH engine. Training histograms are one contiguous float32 matrix grouped by label,
+    # so a batch of probes is scored against every sample in a few vectorized blocks and the best
+    # sample per identity falls out of a single reduceat. predict() keeps the
+    # cv2.face.LBPHFaceRecognizer contract: label, conf = matcher.predict(arr)
+    def __init__(self, histograms, labels, params=None, label_map=None, version=None):
+        labels = np.asarray(labels, dtype=np.int32).ravel()
+        order = np.argsort(labels, kind='stable')
+        if len(labels) and np.any(order != np.arange(len(labels))):
+            histograms, labels = histograms[order], labels[order]
+        if not isinstance(histograms, np.memmap):
+            histograms = np.ascontiguousarray(histograms, dtype=np.float32)
+        self.histograms = histograms
+        self.labels = labels
+        self.identities, self._label_starts = np.unique(labels, return_index=True)
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.label_map = label_map or {}
+        self.version = version
+
+    def __len__(self):
+        return len(self.labels)
+
+    def probe_histograms(self, imgs):
+        p = self.params
+        return lbph_histogram(np.asarray(imgs), p['radius'], p['neighbors'], p['grid_x'], p['grid_y'])
+
+    def distances(self, probes):
+        # Chi-square (HISTCMP_CHISQR_ALT) between probe histograms [B, dims] and all samples -> [B, samples].
+        # Samples are scored in row blocks with two reused scratch buffers, so memory stays bounded
+        # by DISTANCE_BLOCK_BYTES however large the gallery is
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        samples, dims = self.histograms.shape
+        out = np.empty((probes.shape[0], samples), dtype=np.float64)
+        block = max(1, min(samples, DISTANCE_BLOCK_BYTES // (8 * max(dims, 1))))
+        num = np.empty((block, dims), dtype=np.float32)
+        den = np.empty((block, dims), dtype=np.float32)
+        for start in range(0, samples, block):
+            h = self.histograms[start:start + block]
+            n = len(h)
+            for i, q in enumerate(probes):
+                np.subtract(h, q, out=num[:n])
+                np.square(num[:n], out=num[:n])
+                np.add(h, q, out=den[:n])
+                den[:n] += _TINY
+                np.divide(num[:n], den[:n], out=num[:n])
+                out[i, start:start + n] = num[:n].sum(axis=1)
+        out *= 2.0
+        return out
+
+    def identify(self, imgs, k=1):
+        # Top-k identities per probe: (labels [B, k], confs [B, k]), best first.
+        # imgs is one image or a batch; labels beyond the threshold come back as -1
+        imgs = np.asarray(imgs)
+        if imgs.ndim == 2:
+            imgs = imgs[None]
+        k = min(k, len(self.identities))
+        if k == 0:
+            shape = (imgs.shape[0], 1)
+            return np.full(shape, -1, np.int32), np.full(shape, self.params['threshold'])
+        per_identity = np.minimum.reduceat(self.distances(self.probe_histograms(imgs)), self._label_starts, axis=1)
+        if k < per_identity.shape[1]:
+            top = np.argpartition(per_identity, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(per_identity.shape[1]), (per_identity.shape[0], k))
+        confs = np.take_along_axis(per_identity, top, axis=1)
+        order = np.argsort(confs, axis=1, kind='stable')
+        top, confs = np.take_along_axis(top, order, axis=1), np.take_along_axis(confs, order, axis=1)
+        labels = self.identities[top].astype(np.int32)
+        rejected = confs >= self.params['threshold']
+        labels[rejected] = -1
+        confs[rejected] = self.params['threshold']
+        return labels, confs
+
+    def predict_batch(self, imgs):
+        labels, confs = self.identify(imgs, k=1)
+        return [(int(l), float(c)) for l, c in zip(labels[:, 0], confs[:, 0])]
+
+    def predict(self, img):
+        return self.predict_batch(np.asarray(img)[None])[0]
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_durable(path, write):
+    with open(path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_json(path, data):
+    _write_durable(path, lambda f: f.write(json.dumps(data, indent=2).encode('utf-8')))
+
+
+def save_model(model_dir, histograms, labels, params=None, label_map=None, version=None):
+    os.makedirs(model_dir, exist_ok=True)
+    histograms = np.ascontiguousarray(histograms, dtype=np.float32)
+    labels = np.ascontiguousarray(labels, dtype=np.int32).ravel()
+    if histograms.ndim != 2 or histograms.shape[0] != labels.shape[0]:
+        raise ValueError('histograms must be [samples, dims] with one label per sample')
+    files = {}
+    sizes = {}
+    for name, arr in ((HISTOGRAMS_FILE, histograms), (LABELS_FILE, labels)):
+        path = os.path.join(model_dir, name)
+        _write_durable(path, lambda f: np.save(f, arr))
+        files[name] = _sha256(path)
+        sizes[name] = os.path.getsize(path)
+    manifest = {
+        'format': MODEL_FORMAT,
+        'format_version': MODEL_FORMAT_VERSION,
+        'version': version,
+        'params': dict(DEFAULT_PARAMS, **(params or {})),
+        'samples': int(histograms.shape[0]),
+        'dims': int(histograms.shape[1]),
+        'label_map': dict(label_map or {}),
+        'files': files,
+        'sizes': sizes,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    _write_json(os.path.join(model_dir, MANIFEST_FILE), manifest)
+    return manifest
+
+
+def load_model(model_dir, mmap=True, verify=False):
+    # File sizes and array shapes are always checked against the manifest, which costs no data
+    # reads; verify=True also hashes every file (reads the whole model)
+    with open(os.path.join(model_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != MODEL_FORMAT:
+        raise ValueError(f"Unsupported model format: {manifest.get('format')}")
+    for name, expected in manifest.get('sizes', {}).items():
+        if os.path.getsize(os.path.join(model_dir, name)) != expected:
+            raise ValueError(f'Size mismatch for {name} in {model_dir}')
+    if verify:
+        for name, expected in manifest.get('files', {}).items():
+            if _sha256(os.path.join(model_dir, name)) != expected:
+                raise ValueError(f'Checksum mismatch for {name} in {model_dir}')
+    histograms = np.load(os.path.join(model_dir, HISTOGRAMS_FILE), mmap_mode='r' if mmap else None)
+    labels = np.load(os.path.join(model_dir, LABELS_FILE))
+    if histograms.shape != (manifest['samples'], manifest['dims']) or labels.shape != (manifest['samples'],):
+        raise ValueError(f'Array shapes in {model_dir} do not match the manifest')
+    return LBPHMatcher(histograms, labels, manifest['params'], manifest.get('label_map'), manifest.get('version'))
+
+
+def new_version():
+    # Sortable and unique across nodes training at the same moment
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S%fZ') + '-' + uuid.uuid4().hex[:6]
+
+
+def read_current(store_dir):
+    try:
+        with open(os.path.join(store_dir, CURRENT_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def publish_model(store_dir, histograms, labels, params=None, label_map=None, keep=KEEP_VERSIONS):
+    # Write the artifacts under a temporary name, then make them visible with two renames:
+    # the version directory first, then current.json. Readers never see a partial model.
+    version = new_version()
+    versions_dir = os.path.join(store_dir, VERSIONS_DIR)
+    os.makedirs(versions_dir, exist_ok=True)
+    tmp_dir = os.path.join(versions_dir, f'.tmp-{version}')
+    try:
+        manifest = save_model(tmp_dir, histograms, labels, params, label_map, version)
+        os.replace(tmp_dir, os.path.join(versions_dir, version))
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    current = {
+        'version': version,
+        'path': f'{VERSIONS_DIR}/{version}',
+        'manifest_sha256': _sha256(os.path.join(versions_dir, version, MANIFEST_FILE)),
+        'published_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    tmp_current = os.path.join(store_dir, f'.{CURRENT_FILE}.{version}')
+    _write_json(tmp_current, current)
+    os.replace(tmp_current, os.path.join(store_dir, CURRENT_FILE))
+    prune_versions(store_dir, keep)
+    return manifest
+
+
+def prune_versions(store_dir, keep=KEEP_VERSIONS):
+    # Old versions stay readable for nodes that have not swapped yet; only the oldest are removed
+    versions_dir = os.path.join(store_dir, VERSIONS_DIR)
+    current = read_current(store_dir) or {}
+    versions = sorted(v for v in os.listdir(versions_dir) if not v.startswith('.'))
+    for version in (versions[:-keep] if keep else []):
+        if version != current.get('version'):
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+
+
+def load_current(store_dir, verify=False):
+    # The manifest checksum is always checked; verify=True also hashes the array files
+    current = read_current(store_dir)
+    if current is None:
+        return None
+    model_dir = os.path.join(store_dir, current['path'])
+    if _sha256(os.path.join(model_dir, MANIFEST_FILE)) != current['manifest_sha256']:
+        raise ValueError(f"Manifest checksum mismatch for version {current['version']}")
+    return load_model(model_dir, verify=verify)
+
+
+class ModelRegistry:
+    # Per-process holder of the published model. get() re-reads current.json at most every
+    # check_interval seconds and swaps in a new version without a restart; if a new version
+    # fails to load, the previous one keeps serving.
+    def __init__(self, store_dir, check_interval=2.0):
+        self.store_dir = store_dir
+        self.check_interval = check_interval
+        self._matcher = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._matcher.version if self._matcher is not None else None
+
+    def get(self):
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self.reload()
+        return self._matcher
+
+    def reload(self):
+        current = read_current(self.store_dir)
+        if current is None or current['version'] == self.version:
+            return self._matcher
+        with self._lock:
+            if current['version'] != self.version:
+                try:
+                    self._matcher = load_current(self.store_dir)
+                except (OSError, ValueError) as e:
+                    log.warning('Model reload failed for version %s: %s', current['version'], e)
+        return self._matcher
+
+
+def recognizer_params(recognizer):
+    return {
+        'radius': int(recognizer.getRadius()),
+        'neighbors': int(recognizer.getNeighbors()),
+        'grid_x': int(recognizer.getGridX()),
+        'grid_y': int(recognizer.getGridY()),
+        'threshold': float(recognizer.getThreshold()),
+    }
+
+
+def recognizer_histograms(recognizer):
+    histograms = recognizer.getHistograms()
+    if not len(histograms):
+        return np.zeros((0, 0), np.float32)
+    return np.vstack([h.reshape(1, -1) for h in histograms])
+
+
+def publish_recognizer(recognizer, store_dir, label_map=None):
+    # Publish a trained cv2.face.LBPHFaceRecognizer as a new version
+    return publish_model(store_dir, recognizer_histograms(recognizer), recognizer.getLabels(),
+                         recognizer_params(recognizer), label_map)
+
+
+def convert_yaml_model(yaml_path, store_dir, label_map=None):
+    # One-off migration from recognizer.write() YAML; the only place opencv-contrib is still needed
+    try:
+        import cv2
+        cv2.face
+    except (ImportError, AttributeError):
+        raise RuntimeError('Converting a YAML model needs opencv-contrib-python; retrain instead with `flask train-model`')
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(yaml_path)
+    manifest = publish_recognizer(recognizer, store_dir, label_map)
+    # Full checksum pass once, right after writing, rather than on every hot swap
+    load_current(store_dir, verify=True)
+    return manifest
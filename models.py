@@ -10,7 +10,7 @@ Base = declarative_base()
 
 
 # models.py
-from sqlalchemy import Column, Integer, String, Enum, ForeignKey, Date
+from sqlalchemy import Column, Integer, String, Enum, ForeignKey, Date, DateTime, UniqueConstraint, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -58,6 +58,21 @@ class Attendance(Base):
     remarks = Column(String(255))
     student = relationship('Profile', back_populates='attendance_records')
 
+# One student's closed academic year, as day bitmaps (see attendance_archive.py)
+class AttendanceArchive(Base):
+    __tablename__ = 'attendance_archive'
+    __table_args__ = (UniqueConstraint('student_id', 'academic_year'),)
+    archive_id = Column(Integer, primary_key=True, autoincrement=True)
+    student_id = Column(Integer, ForeignKey('profiles.profile_id'), nullable=False)
+    academic_year = Column(Integer, nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    recorded_days = Column(LargeBinary, nullable=False)
+    present_days = Column(LargeBinary, nullable=False)
+    leave_days = Column(LargeBinary, nullable=False)
+    day_count = Column(Integer, nullable=False)
+    remarks = Column(Text)
+
 # Complaint model
 class Complaint(Base):
     __tablename__ = 'complaints'
@@ -67,4 +82,19 @@ class Complaint(Base):
     description = Column(Text, nullable=False)
     status = Column(Enum('Open', 'Closed', 'Resolved'), default='Open', nullable=False)
     created_at = Column(Date, nullable=False)
-    student = relationship('Profile')
\ No newline at end of file
+    student = relationship('Profile')
+
+# Enrollment image stored under uploads/<username>/<file_name>, named by the content hash
+class FaceImage(Base):
+    __tablename__ = 'face_images'
+    __table_args__ = (UniqueConstraint('student_id', 'content_hash'),)
+    face_image_id = Column(Integer, primary_key=True, autoincrement=True)
+    student_id = Column(Integer, ForeignKey('profiles.profile_id'), nullable=False, index=True)
+    pose_label = Column(String(50), nullable=False, default='capture')
+    content_hash = Column(String(64), nullable=False)
+    file_name = Column(String(100), nullable=False)
+    width = Column(Integer)
+    height = Column(Integer)
+    byte_size = Column(Integer)
+    created_at = Column(DateTime, nullable=False)
+    student = relationship('Profile')
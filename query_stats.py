@@ -0,0 +1,71 @@
+# query_stats.py
+# Per-request SQL accounting built on SQLAlchemy cursor events.
+# instrument(engine, ...) keeps g.sql_query_count / g.sql_query_seconds for the current Flask
+# request and reports slow statements. count_queries() / assert_max_queries() record every
+# statement executed inside a block, e.g. to hold an endpoint to a query budget in a test:
+#
+#     with query_stats.assert_max_queries(6):
+#         client.get('/admin/get-student-list', headers={'Authorization': 'demo-admin'})
+import threading, time
+from contextlib import contextmanager
+from flask import g, has_request_context
+from sqlalchemy import event
+
+_recorders = []
+_recorders_lock = threading.Lock()
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.statements = []
+        self.seconds = 0.0
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def add(self, statement, elapsed):
+        self.statements.append(statement)
+        self.seconds += elapsed
+
+
+def instrument(engine, slow_query_seconds=None, on_slow_query=None):
+    # on_slow_query(statement, elapsed_seconds) is called for statements at or over the threshold
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        if has_request_context():
+            g.sql_query_count = g.get('sql_query_count', 0) + 1
+            g.sql_query_seconds = g.get('sql_query_seconds', 0.0) + elapsed
+        if _recorders:
+            with _recorders_lock:
+                recorders = list(_recorders)
+            for recorder in recorders:
+                recorder.add(statement, elapsed)
+        if slow_query_seconds is not None and elapsed >= slow_query_seconds and on_slow_query:
+            on_slow_query(statement, elapsed)
+
+
+@contextmanager
+def count_queries():
+    recorder = QueryRecorder()
+    with _recorders_lock:
+        _recorders.append(recorder)
+    try:
+        yield recorder
+    finally:
+        with _recorders_lock:
+            _recorders.remove(recorder)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    with count_queries() as recorder:
+        yield recorder
+    if recorder.count > limit:
+        listing = '\n'.join(f'  {i}. {s}' for i, s in enumerate(recorder.statements, start=1))
+        raise AssertionError(f'{recorder.count} queries executed, budget is {limit}:\n{listing}')
@@ -0,0 +1,52 @@
+# response_cache.py
+# Rendered JSON bodies of read-heavy endpoints, keyed by (tag, role). Write endpoints call
+# invalidate(tag) after committing. Entries also expire after ttl_seconds, which bounds how
+# stale another worker process can be, since invalidation is per process. Each entry carries
+# an ETag (hash of the body) and a Last-Modified time, which only moves when the body changes.
+import datetime, hashlib, threading, time
+from collections import namedtuple
+
+Entry = namedtuple('Entry', 'body etag last_modified built_at')
+
+
+class ResponseCache:
+    def __init__(self, ttl_seconds=30.0):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, tag):
+        # Read before building a body and pass to put(), so a body built while a write was
+        # committing is not cached
+        return self._generations.get(tag, 0)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry.built_at >= self.ttl_seconds:
+            return None
+        return entry
+
+    def put(self, key, body, generation):
+        etag = hashlib.sha1(body).hexdigest()
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        with self._lock:
+            previous = self._entries.get(key)
+            last_modified = previous.last_modified if previous is not None and previous.etag == etag else now
+            entry = Entry(body, etag, last_modified, time.monotonic())
+            if self._generations.get(key[0], 0) == generation:
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in [k for k in self._entries if k[0] in tags]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            for tag in {k[0] for k in self._entries}:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            self._entries.clear()